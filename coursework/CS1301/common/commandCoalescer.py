@@ -0,0 +1,140 @@
+# Robot wrapper that drops redundant wheel and light writes.
+#
+#     robot = CoalescingRobot(makeRobot("PAIGE-BOT"))
+#
+# set_wheel_speeds and the set_lights_* calls return at once. The write is sent from a
+# background task on the next pass of the event loop, so a burst of writes in one tick
+# collapses into its final value, and a write equal to the state last sent is skipped.
+# Any other SDK call first waits for pending writes, so commands still reach the robot
+# in the order the script issued them. After move/turn/stop, or an event such as a
+# bump, the wheel state is unknown and the next speed is always sent.
+# A (0, 0) stop is never deferred: it replaces any pending wheel write and is sent
+# before set_wheel_speeds returns, without waiting for other pending writes. It is
+# sent even when the wheels are already stopped, unless always_send_stop is False.
+# A write that fails in the background is raised by the next call to the wrapper.
+#
+# sent and suppressed count the writes that went out and the ones that were dropped.
+
+import asyncio
+
+from robotProxy import RobotProxy
+
+# Calls after which the wheels are no longer doing what was last commanded
+MOTION_CALLS = {"move", "turn_left", "turn_right", "stop", "navigate_to", "arc_left",
+                "arc_right", "set_left_speed", "set_right_speed"}
+
+
+class CoalescingRobot(RobotProxy):
+    def __init__(self, robot, always_send_stop=True):
+        super().__init__(robot)
+        self.always_send_stop = always_send_stop
+        self.sent = 0
+        self.suppressed = 0
+        self._state = {"wheels": None, "lights": None}   # last sent, None if unknown
+        self._pending = {}        # key -> (state, method name, args), in issue order
+        self._flush_task = None
+        self._error = None        # exception of a failed background write
+
+    async def set_wheel_speeds(self, left, right):
+        if left == 0 and right == 0:
+            await self._stop_now()
+        else:
+            self._defer("wheels", (left, right), "set_wheel_speeds", (left, right))
+
+    async def set_lights_rgb(self, red, green, blue):
+        self._defer("lights", ("on", red, green, blue), "set_lights_rgb", (red, green, blue))
+
+    async def set_lights_on_rgb(self, red, green, blue):
+        self._defer("lights", ("on", red, green, blue), "set_lights_on_rgb", (red, green, blue))
+
+    async def set_lights_blink_rgb(self, red, green, blue):
+        self._defer("lights", ("blink", red, green, blue), "set_lights_blink_rgb",
+                    (red, green, blue))
+
+    async def set_lights_spin_rgb(self, red, green, blue):
+        self._defer("lights", ("spin", red, green, blue), "set_lights_spin_rgb",
+                    (red, green, blue))
+
+    async def set_lights_off(self):
+        self._defer("lights", ("off",), "set_lights_off", ())
+
+    async def flush(self):
+        # Waits until every deferred write has been sent
+        while True:
+            self._raise_error()
+            if self._flush_task is not None and not self._flush_task.done():
+                await asyncio.shield(self._flush_task)
+            elif self._pending:
+                self._schedule()
+            else:
+                return
+
+    def invalidate(self):
+        # Forgets the cached state, so the next writes are sent even if they look redundant
+        self._state = {key: None for key in self._state}
+
+    async def _stop_now(self):
+        self._raise_error()
+        if self._pending.pop("wheels", None) is not None:
+            self.suppressed += 1   # superseded by the stop
+        if self._state["wheels"] == (0, 0) and not self.always_send_stop:
+            self.suppressed += 1
+            return
+        self._state["wheels"] = (0, 0)
+        self.sent += 1
+        try:
+            await self.inner.set_wheel_speeds(0, 0)
+        except Exception:
+            self._state["wheels"] = None
+            raise
+
+    def _defer(self, key, state, method, args):
+        self._raise_error()
+        if self._pending.pop(key, None) is not None:
+            self.suppressed += 1   # superseded within the same tick
+        if state == self._state[key]:
+            self.suppressed += 1
+            return
+        self._pending[key] = (state, method, args)
+        self._schedule()
+
+    def _schedule(self):
+        if self._flush_task is None or self._flush_task.done():
+            self._flush_task = asyncio.get_running_loop().create_task(self._flush())
+
+    async def _flush(self):
+        while self._pending:
+            key = next(iter(self._pending))
+            state, method, args = self._pending.pop(key)
+            self._state[key] = state
+            self.sent += 1
+            try:
+                await getattr(self.inner, method)(*args)
+            except Exception as error:
+                self._state[key] = None
+                self._error = error   # nobody awaits this task, so hand it to the next call
+                return
+
+    def _raise_error(self):
+        if self._error is not None:
+            error, self._error = self._error, None
+            raise error
+
+    def _wrap_call(self, name, method):
+        async def call(*args, **kwargs):
+            await self.flush()
+            try:
+                return await method(*args, **kwargs)
+            finally:
+                if name in MOTION_CALLS:
+                    self._state["wheels"] = None
+        return call
+
+    def _on_event(self, name):
+        # the robot may have reacted on its own (e.g. stopped against a bumper)
+        if name != "when_play":
+            self._state["wheels"] = None
+
+    async def _after_event(self, name):
+        # a handler's last write (usually a stop) must not wait for the next tick
+        await self.flush()
@@ -0,0 +1,75 @@
+# Runs a control loop at a fixed rate. `await robot.wait(0.1)` at the end of a loop
+# waits 0.1 s on top of however long the sensor reads and commands took, so the loop
+# really runs slower than intended. tick() only waits for what is left of the period.
+#
+#     control = PeriodicLoop(rate=10)
+#
+#     while not STOP:
+#         ...                       # read sensors, send commands
+#         await control.tick()      # instead of await robot.wait(0.1)
+#
+# Periods are counted from one deadline to the next, so the rate doesn't drift. A tick
+# that is still busy when its period is over is an overrun: the next one starts right
+# away and the schedule restarts from there instead of rushing to catch up. Call
+# reset() before entering a loop, or after something that blocks on purpose (a turn,
+# a long wait), so that time isn't counted as an overrun.
+# ticks, overruns, max_overrun, mean_jitter and max_jitter describe how it went
+# (jitter: how late ticks woke up after their deadline); summary() formats them.
+
+import asyncio
+
+
+class PeriodicLoop:
+    def __init__(self, rate=10.0):
+        self.rate = rate
+        self.period = 1.0 / rate
+        self.ticks = 0
+        self.overruns = 0
+        self.max_overrun = 0.0     # seconds past the deadline of the worst overrun
+        self.max_jitter = 0.0
+        self._jitter_total = 0.0
+        self._on_time = 0          # ticks that waited, which the jitter is averaged over
+        self._next = None          # deadline of the current period, None after reset()
+
+    @property
+    def mean_jitter(self):
+        return self._jitter_total / self._on_time if self._on_time else 0.0
+
+    def reset(self):
+        # Starts the schedule over from the next tick
+        self._next = None
+
+    async def tick(self):
+        # Waits out the rest of the period
+        loop = asyncio.get_running_loop()
+        now = loop.time()
+        self.ticks += 1
+        if self._next is None:
+            self._next = now + self.period
+        elif now >= self._next:
+            self.overruns += 1
+            self.max_overrun = max(self.max_overrun, now - self._next)
+            self._next = now + self.period
+            await asyncio.sleep(0)  # still let other tasks run
+            return
+
+        # asyncio.sleep rather than robot.wait: a wrapped robot may do work (e.g. send
+        # pending commands) before waiting, which would make every tick late
+        await asyncio.sleep(self._next - now)
+        late = max(0.0, loop.time() - self._next)   # never early, up to rounding
+        self._jitter_total += late
+        self._on_time += 1
+        self.max_jitter = max(self.max_jitter, late)
+        self._next += self.period
+
+    async def run(self, step):
+        # Calls the coroutine function step() once per period until it returns False
+        self.reset()
+        while await step() is not False:
+            await self.tick()
+
+    def summary(self):
+        return ("{} ticks at {:g} Hz, {} overruns (worst {:.3f} s late), "
+                "jitter mean {:.4f} s, max {:.4f} s".format(
+                    self.ticks, self.rate, self.overruns, self.max_overrun,
+                    self.mean_jitter, self.max_jitter))
@@ -0,0 +1,119 @@
+# Plays notes and light changes from a background task so a control loop never waits
+# on audio. Every call returns immediately; items are played in order by the task.
+#
+#     feedback = FeedbackQueue(robot)
+#     feedback.play_note(Note.D7, 0.3)              # instead of await robot.play_note(...)
+#     feedback.play_notes([(Note.C4, 0.1)] * 3)     # several notes as one item
+#     feedback.set_lights_rgb(0, 0, 255)
+#
+# When the loop queues faster than the robot can play:
+#   - an item identical to the last one still waiting is merged into it,
+#   - a light change replaces any light change still waiting (only the last one shows),
+#   - beyond max_pending waiting items the oldest are dropped,
+#   - items that waited longer than max_age seconds are dropped instead of played late.
+# played, merged and dropped count what happened to the items.
+
+import asyncio
+from collections import deque
+
+
+class FeedbackQueue:
+    def __init__(self, robot, max_pending=4, max_age=1.0):
+        self.robot = robot
+        self.max_pending = max_pending
+        self.max_age = max_age
+        self.played = 0
+        self.merged = 0
+        self.dropped = 0
+        self._pending = deque()   # (kind, args, time queued)
+        self._busy = False        # an item is being played right now
+        self._task = None
+        self._wake = asyncio.Event()
+        self._idle = asyncio.Event()
+        self._idle.set()
+        self._error = None
+
+    def play_note(self, frequency, duration):
+        self.play_notes([(frequency, duration)])
+
+    def play_notes(self, notes):
+        # Queues (frequency, duration) pairs to be played back to back as one item
+        self._put("notes", tuple(notes))
+
+    def set_lights_rgb(self, r, g, b):
+        # Queues a light change; a newer one replaces it if it hasn't been shown yet
+        for item in list(self._pending):
+            if item[0] == "lights":
+                self._pending.remove(item)
+                self.merged += 1
+        self._put("lights", (r, g, b))
+
+    def clear(self):
+        # Forgets everything that hasn't started playing
+        self.dropped += len(self._pending)
+        self._pending.clear()
+        if not self._busy:
+            self._idle.set()
+
+    async def drain(self):
+        # Waits until everything queued so far has been played (or dropped)
+        await self._idle.wait()
+        if self._error is not None:
+            raise self._error
+
+    def stop(self):
+        # Stops the background task; items still waiting are dropped
+        self.clear()
+        if self._task is not None:
+            self._task.cancel()
+            self._task = None
+        self._busy = False
+        self._idle.set()
+
+    def _put(self, kind, args):
+        if self._error is not None:
+            raise self._error
+        if self._task is None or self._task.done():
+            self._task = asyncio.get_running_loop().create_task(self._run())
+
+        if self._pending and self._pending[-1][0] == kind and self._pending[-1][1] == args:
+            self.merged += 1
+            return
+        self._pending.append((kind, args, asyncio.get_running_loop().time()))
+        while len(self._pending) > self.max_pending:
+            self._pending.popleft()
+            self.dropped += 1
+        self._idle.clear()
+        self._wake.set()
+
+    async def _run(self):
+        loop = asyncio.get_running_loop()
+        try:
+            while True:
+                if not self._pending:
+                    if not self._busy:
+                        self._idle.set()
+                    self._wake.clear()
+                    await self._wake.wait()
+                    continue
+
+                kind, args, queued = self._pending.popleft()
+                if loop.time() - queued > self.max_age:
+                    self.dropped += 1
+                    continue
+
+                self._busy = True
+                if kind == "notes":
+                    for frequency, duration in args:
+                        await self.robot.play_note(frequency, duration)
+                else:
+                    await self.robot.set_lights_rgb(*args)
+                self._busy = False
+                self.played += 1
+        except asyncio.CancelledError:
+            raise
+        except Exception as error:
+            # report it from the next call instead of losing it in the task
+            self._error = error
+            self._busy = False
+            self._idle.set()
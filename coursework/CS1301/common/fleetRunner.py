@@ -0,0 +1,376 @@
+# Runs lab scripts on several robots at once, in one process and one event loop.
+#
+#     python fleetRunner.py fleet.txt
+#
+# Each robot gets its own fresh copy of its script (its own globals, flags and maze), so
+# the scripts run unchanged: makeRobot() hands them their robot, and robot.play() at the
+# end of the script just returns; the runner starts every robot's when_play handlers
+# together once the robots are connected. Scripts that write files (telemetry) write
+# the same ones for every robot running that script; MazeSolver saves no map here.
+#
+# Fleet files are plain text, one statement per line ('#' starts a comment), paths are
+# relative to the fleet file:
+#     robot NAME SCRIPT [ARENA]   a robot and the script it runs; with an arena file the
+#                                 robot is simulated (simRobot.py) instead of Bluetooth
+#     pool N                      most robots connected at the same time (default: no
+#                                 limit); a robot holds its place for its whole run, so
+#                                 robots past the first N only start as others finish
+#     connect N                   connection attempts at the same time (default 2)
+#     retries N                   reconnect attempts before a robot fails (default 5)
+#     timeout SECONDS             longest a robot's behavior may run (default 600)
+# A fleet is either all simulated (then it runs on one virtual clock) or all real.
+#
+# Real robots are found with a single Bluetooth scan for the whole fleet (repeated
+# only for robots it missed) instead of one scan per robot. A robot whose connection
+# drops is reconnected with exponential backoff, one reconnect at a time however many
+# calls failed. Calls that failed because of it are retried once if sending them
+# twice does no harm (reads and settings, not move, turn or navigate_to, which may
+# have been half done). Like with Robot.play(), the stop button of any robot stops
+# the whole fleet. A table of per-robot stats is printed at the end.
+
+import asyncio
+import os
+import runpy
+import sys
+import time
+
+import robotBackend
+from robotProxy import RobotProxy
+from simRobot import Arena, SimCreate3, VirtualTimeLoop
+
+BACKOFF_START = 0.5     # seconds before the first reconnect attempt, doubling each time
+BACKOFF_MAX = 10.0
+SCAN_TIME = 5.0         # seconds per shared Bluetooth scan
+LINK_CHECK = 1.0        # seconds without a packet after which the connection is checked
+
+try:
+    from bleak.exc import BleakError
+    CONNECTION_ERRORS = (ConnectionError, OSError, asyncio.TimeoutError, BleakError)
+except ImportError:
+    CONNECTION_ERRORS = (ConnectionError, OSError, asyncio.TimeoutError)
+
+
+def isRetrySafe(name):
+    # Whether the SDK call `name` may be sent again after it failed part way
+    return name.startswith(("get_", "set_")) or name == "stop"
+
+
+class FleetMember:
+    # One robot of the fleet, its script and its stats
+    def __init__(self, name, script, arena=None):
+        self.name = name
+        self.script = script
+        self.arena = arena              # arena file path for a simulated robot, else None
+        self.robot = None               # the SDK (or simulated) robot
+        self.proxy = None               # the FleetRobot handed to the script
+        self.address = None
+        self.state = "waiting"
+        self.connects = 0
+        self.reconnects = 0
+        self.calls = 0
+        self.errors = 0
+        self.connect_time = 0.0
+        self.run_time = 0.0
+        self.error = None
+
+    @property
+    def simulated(self):
+        return self.arena is not None
+
+    def build(self):
+        if self.simulated:
+            self.robot = SimCreate3(Arena.fromFile(self.arena))
+        else:
+            from irobot_edu_sdk.backend.bluetooth import Bluetooth
+            from irobot_edu_sdk.robots import Create3
+            self.robot = Create3(Bluetooth(self.name, self.address))
+        self.proxy = FleetRobot(self.robot, self)
+
+    async def connect(self):
+        self.connects += 1
+        if not self.simulated:
+            await self.robot._backend.connect()
+            if not await self.robot._backend.is_connected():
+                raise ConnectionError("{} did not connect".format(self.name))
+
+    async def disconnect(self):
+        if not self.simulated:
+            await self.robot._backend.disconnect()
+
+
+class FleetRobot(RobotProxy):
+    # What the script sees as its robot: keeps the when_play handlers for the runner,
+    # counts calls, and reconnects when a call fails on a lost connection, retrying the
+    # call once if that is safe
+    def __init__(self, robot, member):
+        super().__init__(robot)
+        self.member = member
+        self.play_handlers = []
+        self.reconnect = None           # set by the runner while the robot is running
+
+    def play(self):
+        pass  # the runner starts the behavior when the whole fleet is ready
+
+    def _wrap_event(self, name, register):
+        if name != "when_play":
+            return super()._wrap_event(name, register)
+        return self.play_handlers.append
+
+    def _wrap_call(self, name, method):
+        async def call(*args, **kwargs):
+            self.member.calls += 1
+            try:
+                return await method(*args, **kwargs)
+            except CONNECTION_ERRORS:
+                self.member.errors += 1
+                if self.reconnect is None:
+                    raise
+                await self.reconnect()
+                if not isRetrySafe(name):
+                    raise
+                return await method(*args, **kwargs)
+        return call
+
+
+class ConnectionPool:
+    # Limits how many robots connect at the same time (and, with a size, how many are
+    # connected at all), and shares Bluetooth scans between them
+    def __init__(self, size=None, concurrent_connects=2, retries=5):
+        self.size = size
+        self.retries = retries
+        self.scans = 0
+        self._slots = asyncio.Semaphore(size) if size else None
+        self._connecting = asyncio.Semaphore(concurrent_connects)
+        self._scan_lock = asyncio.Lock()
+
+    async def scan(self, members):
+        # One Bluetooth scan for every member without an address yet
+        from bleak import BleakScanner
+        async with self._scan_lock:
+            missing = {m.name: m for m in members if m.address is None}
+            if not missing:
+                return
+            self.scans += 1
+            for device in await BleakScanner.discover(timeout=SCAN_TIME):
+                if device.name in missing:
+                    missing.pop(device.name).address = device.address
+
+    async def connect(self, member, members=()):
+        # Connects member, retrying with exponential backoff; raises ConnectionError
+        # once the retries are used up
+        delay = BACKOFF_START
+        for attempt in range(self.retries + 1):
+            if attempt:
+                await asyncio.sleep(delay)
+                delay = min(delay * 2, BACKOFF_MAX)
+            try:
+                if not member.simulated and member.address is None:
+                    await self.scan(members or (member,))
+                    if member.address is None:
+                        continue
+                async with self._connecting:
+                    await member.connect()
+                return
+            except CONNECTION_ERRORS as error:
+                member.error = error
+        raise ConnectionError("could not connect to {} after {} attempts".format(
+            member.name, self.retries + 1))
+
+    async def __aenter__(self):
+        if self._slots is not None:
+            await self._slots.acquire()
+
+    async def __aexit__(self, *exc):
+        if self._slots is not None:
+            self._slots.release()
+
+
+class FleetRunner:
+    def __init__(self, members, pool_size=None, concurrent_connects=2, retries=5, timeout=600.0):
+        self.members = members
+        self.pool_size = pool_size
+        self.concurrent_connects = concurrent_connects
+        self.retries = retries
+        self.timeout = timeout
+        self.pool = None
+        if len({m.simulated for m in members}) > 1:
+            raise ValueError("a fleet can't mix simulated and real robots")
+
+    @classmethod
+    def fromFile(cls, path):
+        # Reads a fleet file (see the top of this file for the format)
+        base = os.path.dirname(os.path.abspath(path))
+        members = []
+        options = {}
+        names = {"pool": "pool_size", "connect": "concurrent_connects",
+                 "retries": "retries", "timeout": "timeout"}
+        with open(path) as f:
+            for number, line in enumerate(f, 1):
+                words = line.split("#", 1)[0].split()
+                if not words:
+                    continue
+                keyword, values = words[0], words[1:]
+                if keyword == "robot" and len(values) in (2, 3):
+                    paths = [os.path.join(base, value) for value in values[1:]]
+                    members.append(FleetMember(values[0], *paths))
+                elif keyword in names and len(values) == 1:
+                    kind = float if keyword == "timeout" else int
+                    options[names[keyword]] = kind(values[0])
+                else:
+                    raise ValueError("{} line {}: can't read {!r}".format(path, number, line.strip()))
+        if not members:
+            raise ValueError("{} has no robots".format(path))
+        return cls(members, **options)
+
+    def run(self):
+        # Connects the fleet, runs every robot's script and prints the stats
+        simulated = self.members[0].simulated
+        loop = VirtualTimeLoop() if simulated else asyncio.new_event_loop()
+        asyncio.set_event_loop(loop)
+        try:
+            loop.run_until_complete(self._main())
+        except KeyboardInterrupt:
+            print("Stopping the fleet.")
+        finally:
+            leftovers = asyncio.all_tasks(loop)
+            for task in leftovers:
+                task.cancel()
+            loop.run_until_complete(asyncio.gather(*leftovers, return_exceptions=True))
+            loop.close()
+            asyncio.set_event_loop(None)
+            print(self.summary())
+
+    async def _main(self):
+        self.pool = ConnectionPool(self.pool_size, self.concurrent_connects, self.retries)
+        if not self.members[0].simulated:
+            await self.pool.scan(self.members)   # one scan finds the whole fleet
+
+        for member in self.members:
+            member.build()
+            self._load(member)
+
+        if not self.members[0].simulated:
+            from irobot_edu_sdk.robots import Robot
+            Robot._run = True   # the SDK's packet readers run while this is set
+        await asyncio.gather(*(self._run_member(member) for member in self.members))
+
+    def _load(self, member):
+        # Runs the script like `python SCRIPT` with makeRobot() returning this member's robot
+        previous = robotBackend.SIMULATOR
+        robotBackend.SIMULATOR = lambda name: member.proxy
+        sys.path.insert(0, os.path.dirname(member.script))
+        try:
+            runpy.run_path(member.script, run_name="__main__")
+        finally:
+            sys.path.pop(0)
+            robotBackend.SIMULATOR = previous
+
+    async def _run_member(self, member):
+        loop = asyncio.get_running_loop()
+        async with self.pool:
+            member.state = "connecting"
+            started = loop.time()
+            try:
+                await self.pool.connect(member, self.members)
+            except ConnectionError as error:
+                member.state, member.error = "failed", error
+                return
+            member.connect_time = loop.time() - started
+
+            member.state = "running"
+            started = loop.time()
+            background = self._start_robot(member)
+            handlers = [loop.create_task(callback(member.proxy))
+                        for callback in member.proxy.play_handlers]
+            if not member.simulated:
+                background.add_done_callback(lambda task: [h.cancel() for h in handlers])
+            try:
+                if handlers:
+                    done, pending = await asyncio.wait(handlers, timeout=self.timeout)
+                    member.state = "timed out" if pending else "done"
+                    for task in pending:
+                        task.cancel()
+                    for task in done:
+                        if task.cancelled():
+                            # the packet reader ended: the stop button, or a lost connection
+                            stopped = (background.done() and not background.cancelled() and
+                                       background.exception() is None)
+                            member.state = "stopped" if stopped else "failed"
+                        elif task.exception() is not None:
+                            member.state, member.error = "failed", task.exception()
+                else:
+                    member.state = "done"
+            finally:
+                member.run_time = loop.time() - started
+                member.proxy.reconnect = None
+                background.cancel()
+                await asyncio.gather(background, return_exceptions=True)
+                if background.done() and not background.cancelled() and background.exception():
+                    member.error = background.exception()
+                await member.disconnect()
+
+    def _start_robot(self, member):
+        # Starts what keeps the robot going while its script runs: the physics of a
+        # simulated robot, or the packet reader of a real one (which reconnects)
+        loop = asyncio.get_running_loop()
+        robot = member.robot
+        if member.simulated:
+            robot._loop = loop
+            robot._updated = loop.time()
+            return loop.create_task(robot._physics())
+
+        from irobot_edu_sdk.robots import Robot
+        lock = asyncio.Lock()
+
+        async def reconnect():
+            # Calls that fail together all wait for the same reconnect
+            async with lock:
+                if not Robot._run:
+                    raise ConnectionError("the fleet was stopped")
+                if await robot._backend.is_connected():
+                    return
+                member.reconnects += 1
+                try:
+                    await member.disconnect()   # drop the old client before making a new one
+                except CONNECTION_ERRORS:
+                    pass
+                await self.pool.connect(member, self.members)
+
+        async def read_packets():
+            # Like Robot._read_packets(), but Bluetooth.read_packet() waits forever on a
+            # dropped link, so the connection is checked whenever no packet comes for a while
+            await robot.stop()   # reset the robot first, like Robot.play() does
+            while Robot._run:    # cleared by any robot's stop button
+                try:
+                    packet = await asyncio.wait_for(robot._backend.read_packet(), LINK_CHECK)
+                except asyncio.TimeoutError:
+                    if not await robot._backend.is_connected():
+                        await reconnect()
+                    continue
+                robot._decode_packet(packet)
+
+        member.proxy.reconnect = reconnect
+        return loop.create_task(read_packets())
+
+    def summary(self):
+        lines = ["Fleet ({} robots, {} Bluetooth scans):".format(
+                     len(self.members), self.pool.scans if self.pool else 0),
+                 "  {:<14} {:<10} {:>8} {:>10} {:>6} {:>6} {:>9} {:>9}".format(
+                     "robot", "state", "connects", "reconnects", "calls", "errors",
+                     "connect s", "run s")]
+        for m in self.members:
+            lines.append("  {:<14} {:<10} {:>8} {:>10} {:>6} {:>6} {:>9.2f} {:>9.2f}".format(
+                m.name, m.state, m.connects, m.reconnects, m.calls, m.errors,
+                m.connect_time, m.run_time))
+            if m.error is not None and m.state != "done":
+                lines.append("  {:<14} {!r}".format("", m.error))
+        return "\n".join(lines)
+
+
+if __name__ == "__main__":
+    if len(sys.argv) != 2:
+        print("usage: python fleetRunner.py FLEET_FILE")
+        sys.exit(1)
+    started = time.time()
+    FleetRunner.fromFile(sys.argv[1]).run()
+    print("Finished in {:.1f} s".format(time.time() - started))
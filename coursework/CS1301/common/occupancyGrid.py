@@ -0,0 +1,220 @@
+# Map of what the IR sensors have seen: which places around the robot are free and
+# which have something in them, remembered after the robot has driven on.
+#
+#     grid = OccupancyGrid(size=200, resolution=2.0)    # 4 m x 4 m around (0, 0)
+#     grid.add_scan(pose, readings)                     # one pose and its 7 readings
+#     grid.add_scans(poses, readings)                   # (N, 3) x, y, heading and (N, 7)
+#     grid.add_telemetry("DeliveryTelemetry.tlm")       # a recorded run
+#     grid.is_occupied(x, y)
+#
+# Each reading is a ray from its sensor (on the bumper, SENSOR_OFFSET cm from the centre,
+# pointing out at its IR_ANGLES angle from the heading) to the distance it measured.
+# Cells along the ray get more likely free and the cell where it ends more likely
+# occupied; a reading of nothing (past max_range) only clears the ray up to max_range.
+# Cells hold log-odds, so an update is an addition (LOG_ODDS_FREE, LOG_ODDS_HIT, kept
+# within +-LOG_ODDS_LIMIT) and a batch of scans is one vectorized pass: every ray is
+# sampled each half cell, and a cell counts once per ray however often it is sampled.
+#
+# The grid is a window of size x size cells that follows the robot. A scan taken less
+# than `margin` cells from its edge first moves the window (by whole cells) to be
+# centred on it, and whatever falls outside is forgotten, so an arena of any size
+# takes the same memory. Needs numpy.
+#
+# Distances are irDistance()'s 4095 / (r + 1) read as cm, and max_range defaults to
+# irProcessing.IR_RANGE. The simulator produces its readings from the same model, so
+# simulated maps line up with the arena by construction. A real Create 3's proximity
+# readings are not calibrated to it, so the scale of a map made on hardware is unchecked.
+
+import math
+
+try:
+    import numpy as np
+except ImportError:
+    np = None
+
+from irProcessing import IR_ANGLES, IR_RANGE, irDistance
+from telemetry import KIND_IR, KIND_POSE, loadColumns
+
+SENSOR_OFFSET = 17.0    # cm from the robot's centre to the IR sensors on the bumper
+LOG_ODDS_HIT = 0.85
+LOG_ODDS_FREE = -0.4
+LOG_ODDS_LIMIT = 4.0
+OCCUPIED = 0.65         # probability above which a cell counts as occupied
+CHUNK_SCANS = 4096      # scans per vectorized pass, to bound the memory of a long log
+
+
+class OccupancyGrid:
+    def __init__(self, size=200, resolution=2.0, center=(0.0, 0.0), margin=None,
+                 max_range=IR_RANGE):
+        # size: cells per side; resolution: cm per cell; margin: cells, size // 4 by default
+        if np is None:
+            raise ImportError("OccupancyGrid needs numpy")
+        self.size = size
+        self.resolution = resolution
+        self.margin = min(size // 4 if margin is None else margin, size // 2 - 1)
+        self.max_range = max_range
+        self.log_odds = np.zeros((size, size), dtype=np.float32)   # [row y, column x]
+        self.offset = self._offset_for(*center)   # (x, y) cell of the window's corner
+        self.scans = 0
+        self.recenters = 0
+        self._angles = np.radians(np.array(IR_ANGLES))
+        self._steps = np.arange(0.0, max_range, resolution / 2)
+
+    @property
+    def origin(self):
+        # (x, y) in cm of the window's lower left corner
+        return (self.offset[0] * self.resolution, self.offset[1] * self.resolution)
+
+    def cell_of(self, x, y):
+        # (column, row) of the cell holding (x, y), None outside the window
+        col = int(math.floor(x / self.resolution)) - self.offset[0]
+        row = int(math.floor(y / self.resolution)) - self.offset[1]
+        if 0 <= col < self.size and 0 <= row < self.size:
+            return col, row
+        return None
+
+    def recenter(self, x, y):
+        # Moves the window so (x, y) is in its middle, forgetting the cells left behind
+        new = self._offset_for(x, y)
+        dx, dy = new[0] - self.offset[0], new[1] - self.offset[1]
+        if dx == 0 and dy == 0:
+            return
+        shifted = np.zeros_like(self.log_odds)
+        if abs(dx) < self.size and abs(dy) < self.size:
+            shifted[max(0, -dy):self.size - max(0, dy), max(0, -dx):self.size - max(0, dx)] = \
+                self.log_odds[max(0, dy):self.size - max(0, -dy), max(0, dx):self.size - max(0, -dx)]
+        self.log_odds = shifted
+        self.offset = new
+        self.recenters += 1
+
+    def add_scan(self, pose, readings):
+        # One pose (with x, y, heading) and the 7 IR readings taken there
+        self.add_scans([(pose.x, pose.y, pose.heading)], [readings])
+
+    def add_scans(self, poses, readings):
+        # (N, 3) poses as x, y, heading and the (N, 7) readings taken at them; rows with
+        # a NaN are skipped. Returns the number of scans added.
+        poses = np.asarray(poses, dtype=np.float64).reshape(-1, 3)
+        readings = np.asarray(readings).reshape(-1, len(IR_ANGLES))
+        keep = np.isfinite(poses).all(axis=1) & np.isfinite(readings).all(axis=1)
+        if not keep.all():
+            poses, readings = poses[keep], readings[keep]
+
+        start = 0
+        while start < len(poses):
+            # everything up to the first scan near the window's edge goes in one pass
+            chunk = poses[start:start + CHUNK_SCANS]
+            cols = np.floor(chunk[:, 0] / self.resolution) - self.offset[0]
+            rows = np.floor(chunk[:, 1] / self.resolution) - self.offset[1]
+            inner = slice(self.margin, self.size - self.margin)
+            near_edge = np.flatnonzero((cols < inner.start) | (cols >= inner.stop) |
+                                       (rows < inner.start) | (rows >= inner.stop))
+            if near_edge.size and near_edge[0] == 0:
+                self.recenter(chunk[0, 0], chunk[0, 1])
+                continue
+            end = start + (near_edge[0] if near_edge.size else len(chunk))
+            self._update(poses[start:end], readings[start:end])
+            start = end
+        self.scans += len(poses)
+        return len(poses)
+
+    def add_telemetry(self, path, max_gap=1.0):
+        # Adds the IR readings of a recording (telemetry.py), each at the pose
+        # interpolated between the poses read before and after it. Readings outside the
+        # recorded poses, or between two poses more than max_gap seconds apart, are
+        # skipped. Returns the number of scans added.
+        pose_t, poses = loadColumns(path, KIND_POSE)
+        ir_t, readings = loadColumns(path, KIND_IR)
+        if len(pose_t) < 2 or len(ir_t) == 0:
+            return 0
+        after = np.searchsorted(pose_t, ir_t)
+        usable = (after > 0) & (after < len(pose_t))
+        after = np.clip(after, 1, len(pose_t) - 1)
+        usable &= pose_t[after] - pose_t[after - 1] <= max_gap
+        ir_t, readings = ir_t[usable], readings[usable]
+
+        headings = np.degrees(np.unwrap(np.radians(poses[:, 2])))
+        at = np.stack([np.interp(ir_t, pose_t, poses[:, 0]),
+                       np.interp(ir_t, pose_t, poses[:, 1]),
+                       np.interp(ir_t, pose_t, headings) % 360], axis=1)
+        return self.add_scans(at, readings)
+
+    def probability(self):
+        # Occupancy probability of every cell, same shape as log_odds
+        return 1.0 / (1.0 + np.exp(-self.log_odds))
+
+    def probability_at(self, x, y):
+        # Occupancy probability at (x, y); 0.5 (unknown) outside the window
+        cell = self.cell_of(x, y)
+        if cell is None:
+            return 0.5
+        return float(1.0 / (1.0 + math.exp(-self.log_odds[cell[1], cell[0]])))
+
+    def is_occupied(self, x, y, threshold=OCCUPIED):
+        return self.probability_at(x, y) > threshold
+
+    def occupied_points(self, threshold=OCCUPIED):
+        # (M, 2) centres of the occupied cells in cm
+        limit = math.log(threshold / (1.0 - threshold))
+        rows, cols = np.nonzero(self.log_odds > limit)
+        return np.stack([(cols + self.offset[0] + 0.5) * self.resolution,
+                         (rows + self.offset[1] + 0.5) * self.resolution], axis=1)
+
+    def save(self, path):
+        # Writes the grid to a .npz file; load() reads it back
+        np.savez(path, log_odds=self.log_odds, offset=np.array(self.offset),
+                 settings=np.array([self.resolution, self.margin, self.max_range]))
+
+    @classmethod
+    def load(cls, path):
+        with np.load(path) as data:
+            resolution, margin, max_range = data["settings"]
+            grid = cls(size=data["log_odds"].shape[0], resolution=float(resolution),
+                       margin=int(margin), max_range=float(max_range))
+            grid.log_odds = data["log_odds"].astype(np.float32)
+            grid.offset = tuple(int(v) for v in data["offset"])
+        return grid
+
+    def _offset_for(self, x, y):
+        return (int(math.floor(x / self.resolution)) - self.size // 2,
+                int(math.floor(y / self.resolution)) - self.size // 2)
+
+    def _update(self, poses, readings):
+        # One vectorized log-odds update for a batch of scans inside the window
+        if not len(poses):
+            return
+        distances = np.asarray(irDistance(readings), dtype=np.float64)
+        hit = distances < self.max_range
+        length = np.minimum(distances, self.max_range)
+
+        directions = np.radians(poses[:, 2:3]) - self._angles          # (N, 7)
+        cos, sin = np.cos(directions), np.sin(directions)
+        start_x = poses[:, 0:1] + SENSOR_OFFSET * cos
+        start_y = poses[:, 1:2] + SENSOR_OFFSET * sin
+
+        # free: samples along each ray short of where it ends (half a cell short of a hit)
+        free_length = length - np.where(hit, self.resolution / 2, 0.0)
+        steps = self._steps
+        free = steps < free_length[..., None]                          # (N, 7, S)
+        cells = self._cells(start_x[..., None] + steps * cos[..., None],
+                            start_y[..., None] + steps * sin[..., None])
+        free &= cells >= 0
+        # a straight ray never comes back to a cell it left, so only a sample in a new
+        # cell counts
+        free[..., 1:] &= cells[..., 1:] != cells[..., :-1]
+        once = cells[free]
+
+        ends = self._cells(start_x + length * cos, start_y + length * sin)[hit]
+        ends = ends[ends >= 0]
+
+        flat = self.log_odds.reshape(-1)
+        np.add.at(flat, once, LOG_ODDS_FREE)
+        np.add.at(flat, ends, LOG_ODDS_HIT)
+        np.clip(self.log_odds, -LOG_ODDS_LIMIT, LOG_ODDS_LIMIT, out=self.log_odds)
+
+    def _cells(self, x, y):
+        # Flat cell index of each point, -1 outside the window
+        cols = np.floor(x / self.resolution).astype(np.int64) - self.offset[0]
+        rows = np.floor(y / self.resolution).astype(np.int64) - self.offset[1]
+        inside = (cols >= 0) & (cols < self.size) & (rows >= 0) & (rows < self.size)
+        return np.where(inside, rows * self.size + cols, -1)
@@ -0,0 +1,164 @@
+# Robot wrapper that knows roughly where the robot is without asking it. Loops that
+# only read the pose to decide when to stop (drive one cell, drive to the gap) would
+# otherwise poll get_position() every 100 ms, one round trip each.
+#
+#     robot = PoseEstimator(makeRobot("HRISTO-BOT"))
+#
+#     start = await robot.get_position()
+#     await robot.set_wheel_speeds(15, 15)
+#     await robot.drive_until(lambda pose: 45 - math.hypot(pose.x - start.x, pose.y - start.y),
+#                             should_stop=lambda: HAS_COLLIDED)
+#
+# Every pose the robot reports (whoever asked for it, e.g. a SensorHub) becomes the new
+# starting point, and every wheel command changes the speeds the pose is extrapolated
+# with (differential drive, WHEEL_BASE between the wheels). A turn, move or
+# reset_navigation forgets the pose until the next measurement. A reading or command is
+# taken to happen in the middle of its round trip.
+#
+# predict() is the extrapolated pose. pose() predicts too, but measures when the last
+# measurement is older than measure_every. drive_until() measures that often on the
+# way, and when the predicted arrival is less than check_every away it sleeps until
+# then and sends the stop, half a round trip early so it lands on time. It gives up
+# when the wheels aren't driving the robot forward (a turn or stop stopped them), as
+# it would otherwise wait forever.
+# measurements and predictions count the poses handed out each way.
+
+import asyncio
+import math
+
+from robotProxy import RobotProxy
+
+WHEEL_BASE = 23.5       # cm between the wheels of a Create3
+MAX_SPEED = 30.6        # cm/s, the robot clamps wheel speeds to this
+
+# Calls after which the robot stands still somewhere the estimator can't tell
+MOTION_CALLS = {"move", "turn_left", "turn_right", "navigate_to", "arc_left", "arc_right",
+                "reset_navigation"}
+
+
+class EstimatedPose:
+    # Same fields as the SDK's Pose, plus the loop time it is for and whether the
+    # robot measured it (False: extrapolated)
+    __slots__ = ("x", "y", "heading", "time", "measured")
+
+    def __init__(self, x, y, heading, time, measured):
+        self.x = x
+        self.y = y
+        self.heading = heading
+        self.time = time
+        self.measured = measured
+
+
+class PoseEstimator(RobotProxy):
+    def __init__(self, robot, measure_every=0.5, check_every=0.1, wheel_base=WHEEL_BASE):
+        super().__init__(robot)
+        self.measure_every = measure_every  # seconds a measurement is trusted for
+        self.check_every = check_every      # seconds between drive_until checks
+        self.wheel_base = wheel_base
+        self.left = 0.0                     # commanded wheel speeds, cm/s
+        self.right = 0.0
+        self.latency = 0.0                  # round trip of the last pose or wheel call
+        self.measurements = 0
+        self.predictions = 0
+        self._base = None                   # EstimatedPose the prediction starts from
+        self._measured_at = None            # loop time of the last measurement
+
+    @property
+    def speed(self):
+        # Forward speed of the robot's centre, cm/s
+        return (self.left + self.right) / 2
+
+    def predict(self, at=None):
+        # Extrapolated pose at loop time `at` (now), None when no pose is known
+        if self._base is None:
+            return None
+        if at is None:
+            at = asyncio.get_running_loop().time()
+        return self._extrapolate(self._base, at)
+
+    async def pose(self):
+        # The predicted pose, or a fresh measurement when the last one is too old
+        now = asyncio.get_running_loop().time()
+        if self._base is None or now - self._measured_at >= self.measure_every:
+            await self.get_position()
+            return self._base
+        self.predictions += 1
+        return self._extrapolate(self._base, now)
+
+    async def drive_until(self, remaining, should_stop=None, on_pose=None):
+        # Keeps going at the commanded wheel speeds until remaining(pose), the distance
+        # left in cm, is used up, then stops the wheels. True when it got there, False
+        # when should_stop() turned true first or nothing is driving the robot forward.
+        # on_pose(pose) is awaited with every pose checked, e.g. for course corrections;
+        # if it turns the robot it has to set the wheel speeds again.
+        while not (should_stop and should_stop()):
+            pose = await self.pose()
+            if on_pose is not None:
+                await on_pose(pose)
+                if self._base is None:
+                    continue  # it turned, measure again
+            left = remaining(pose)
+            if left > 0 and self.speed > 0:
+                arrival = left / self.speed - self.latency / 2
+                if arrival > self.check_every:
+                    await asyncio.sleep(self.check_every)
+                    continue
+                await asyncio.sleep(max(0.0, arrival))
+                if should_stop and should_stop():
+                    break
+            elif left > 0:
+                return False  # the wheels stopped or go backwards, it would never get there
+            await self.set_wheel_speeds(0, 0)
+            return True
+        return False
+
+    def _extrapolate(self, pose, at):
+        dt = max(0.0, at - pose.time)
+        v = self.speed
+        w = (self.right - self.left) / self.wheel_base     # rad/s, counter-clockwise
+        heading = math.radians(pose.heading)
+        if abs(w) < 1e-9:
+            x = pose.x + v * dt * math.cos(heading)
+            y = pose.y + v * dt * math.sin(heading)
+        else:
+            r = v / w
+            x = pose.x + r * (math.sin(heading + w * dt) - math.sin(heading))
+            y = pose.y - r * (math.cos(heading + w * dt) - math.cos(heading))
+        return EstimatedPose(x, y, (pose.heading + math.degrees(w * dt)) % 360, at, False)
+
+    def _observe(self, pose, at):
+        self._base = EstimatedPose(pose.x, pose.y, pose.heading % 360, at, True)
+        self._measured_at = at
+        self.measurements += 1
+
+    def _command(self, at, left, right):
+        # New wheel speeds from loop time `at` on
+        if self._base is not None:
+            self._base = self._extrapolate(self._base, at)
+        self.left = max(-MAX_SPEED, min(MAX_SPEED, left))
+        self.right = max(-MAX_SPEED, min(MAX_SPEED, right))
+
+    def _wrap_call(self, name, method):
+        async def call(*args, **kwargs):
+            loop = asyncio.get_running_loop()
+            start = loop.time()
+            result = await method(*args, **kwargs)
+            end = loop.time()
+            middle = (start + end) / 2
+            if name == "get_position":
+                self.latency = end - start
+                self._observe(result, middle)
+            elif name == "set_wheel_speeds":
+                self.latency = end - start
+                self._command(middle, *args, **kwargs)
+            elif name == "set_left_speed":
+                self._command(middle, args[0], self.right)
+            elif name == "set_right_speed":
+                self._command(middle, self.left, args[0])
+            elif name == "stop":
+                self._command(middle, 0, 0)
+            elif name in MOTION_CALLS:
+                self._command(end, 0, 0)
+                self._base = None
+            return result
+        return call
@@ -0,0 +1,51 @@
+# Builds the robot object the lab scripts talk to.
+#
+# By default that is a real Create 3 over Bluetooth. Point CS1301_SIM_ARENA at an arena
+# file to run a script on the simulator in simRobot.py instead, e.g. from lab03/:
+#     CS1301_SIM_ARENA=../common/arenas/maze3x3.txt python MazeSolver.py
+# Set CS1301_PROFILE=1 to time every SDK call and print a summary when play() ends
+# (see robotProfiler.py).
+# Set CS1301_RECORD=FILE to record the session to FILE, and CS1301_REPLAY=FILE to run the
+# script against that recording instead of a robot (see sessionRecorder.py).
+
+import os
+
+SIM_ARENA_ENV = "CS1301_SIM_ARENA"
+PROFILE_ENV = "CS1301_PROFILE"
+RECORD_ENV = "CS1301_RECORD"
+REPLAY_ENV = "CS1301_REPLAY"
+
+# Set by simRobot.runScript to hand a prepared simulator to the script being run
+SIMULATOR = None
+
+
+def makeRobot(name):
+    # Returns the robot called `name`, or a simulated one when simulation is requested
+    robot = connectRobot(name)
+    record_path = os.environ.get(RECORD_ENV)
+    if record_path:
+        from sessionRecorder import SessionRecorder
+        robot = SessionRecorder(robot, record_path)
+    if os.environ.get(PROFILE_ENV, "") not in ("", "0"):
+        from robotProfiler import ProfilingRobot
+        robot = ProfilingRobot(robot)
+    return robot
+
+
+def connectRobot(name):
+    if SIMULATOR is not None:
+        return SIMULATOR(name)
+
+    replay_path = os.environ.get(REPLAY_ENV)
+    if replay_path:
+        from sessionRecorder import ReplayCreate3
+        return ReplayCreate3(replay_path)
+
+    arena_path = os.environ.get(SIM_ARENA_ENV)
+    if arena_path:
+        from simRobot import Arena, SimCreate3
+        return SimCreate3(Arena.fromFile(arena_path))
+
+    from irobot_edu_sdk.backend.bluetooth import Bluetooth
+    from irobot_edu_sdk.robots import Create3
+    return Create3(Bluetooth(name))
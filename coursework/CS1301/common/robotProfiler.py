@@ -0,0 +1,91 @@
+# Robot wrapper that times every SDK call and prints where the time went when
+# robot.play() returns (or is stopped with Ctrl+C).
+#
+# makeRobot applies it when CS1301_PROFILE is set, e.g. from lab03/:
+#     CS1301_PROFILE=1 CS1301_SIM_ARENA=../common/arenas/maze3x3.txt python MazeSolver.py
+#
+# For each method it keeps the number of calls, total/min/max time and a histogram of
+# latencies in roughly logarithmic buckets (LATENCY_BUCKETS, in seconds), which the
+# median and 95th percentile in the summary are read from. Times come from the event
+# loop's clock, so under the simulator they are virtual seconds.
+
+import asyncio
+import bisect
+
+from robotProxy import RobotProxy
+
+LATENCY_BUCKETS = (0.001, 0.002, 0.005, 0.01, 0.02, 0.05, 0.1, 0.2, 0.5, 1.0, 2.0, 5.0)
+BUCKET_LABELS = tuple("<{:g}ms".format(b * 1000) for b in LATENCY_BUCKETS) + (">=5s",)
+
+
+class LatencyHistogram:
+    __slots__ = ("count", "total", "min", "max", "buckets")
+
+    def __init__(self):
+        self.count = 0
+        self.total = 0.0
+        self.min = float('inf')
+        self.max = 0.0
+        self.buckets = [0] * (len(LATENCY_BUCKETS) + 1)
+
+    def add(self, seconds):
+        self.count += 1
+        self.total += seconds
+        self.min = min(self.min, seconds)
+        self.max = max(self.max, seconds)
+        self.buckets[bisect.bisect_right(LATENCY_BUCKETS, seconds)] += 1
+
+    def percentile(self, fraction):
+        # Upper edge of the bucket holding that fraction of the calls, at most the max
+        wanted = fraction * self.count
+        seen = 0
+        for i, n in enumerate(self.buckets):
+            seen += n
+            if n and seen >= wanted and i < len(LATENCY_BUCKETS):
+                return min(LATENCY_BUCKETS[i], self.max)
+        return self.max
+
+
+class ProfilingRobot(RobotProxy):
+    def __init__(self, robot):
+        super().__init__(robot)
+        self.histograms = {}      # method name -> LatencyHistogram
+        self.failures = {}        # method name -> calls that raised
+
+    def play(self):
+        try:
+            return self.inner.play()
+        finally:
+            print(self.summary())
+
+    def _wrap_call(self, name, method):
+        histogram = self.histograms.setdefault(name, LatencyHistogram())
+
+        async def call(*args, **kwargs):
+            loop = asyncio.get_running_loop()
+            start = loop.time()
+            try:
+                return await method(*args, **kwargs)
+            except Exception:
+                self.failures[name] = self.failures.get(name, 0) + 1
+                raise
+            finally:
+                histogram.add(loop.time() - start)
+        return call
+
+    def summary(self):
+        used = sorted((h.total, name, h) for name, h in self.histograms.items() if h.count)
+        lines = ["Robot SDK calls (by total time):",
+                 "  {:<22} {:>6} {:>9} {:>8} {:>8} {:>8} {:>8}".format(
+                     "method", "calls", "total s", "mean ms", "p50 ms", "p95 ms", "max ms")]
+        for total, name, h in reversed(used):
+            lines.append("  {:<22} {:>6} {:>9.3f} {:>8.1f} {:>8.1f} {:>8.1f} {:>8.1f}".format(
+                name, h.count, total, 1000 * total / h.count, 1000 * h.percentile(0.5),
+                1000 * h.percentile(0.95), 1000 * h.max))
+            lines.append("  {:<22} ".format("") + "  ".join(
+                "{} {}".format(label, n) for label, n in zip(BUCKET_LABELS, h.buckets) if n))
+        for name, n in sorted(self.failures.items()):
+            lines.append("  {} raised {} times".format(name, n))
+        if not used:
+            lines.append("  (none)")
+        return "\n".join(lines)
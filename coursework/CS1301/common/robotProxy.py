@@ -0,0 +1,53 @@
+# Base class for wrappers that sit between a lab script and its robot.
+#
+# Anything a subclass doesn't define is looked up on the wrapped robot. Async SDK calls
+# go through _wrap_call(), so a subclass can add behavior around every call at once.
+# Event registrations (when_play, when_bumped, ...) are passed on with a handler that
+# hands the wrapper, not the bare robot, to the script's callback, so code inside
+# @event handlers keeps going through the wrapper too.
+
+import functools
+import inspect
+
+
+class RobotProxy:
+    def __init__(self, robot):
+        self.inner = robot
+
+    def __getattr__(self, name):
+        # Only called for names the proxy doesn't have; the wrapped result is cached
+        attr = getattr(self.inner, name)
+        if name.startswith("when_") and callable(attr):
+            wrapped = self._wrap_event(name, attr)
+        elif inspect.iscoroutinefunction(attr):
+            wrapped = self._wrap_call(name, attr)
+        else:
+            return attr
+        self.__dict__[name] = wrapped
+        return wrapped
+
+    def _wrap_call(self, name, method):
+        # Override to intercept async SDK calls
+        return method
+
+    def _on_event(self, name):
+        # Override to react before a script's handler for event `name` runs
+        pass
+
+    async def _after_event(self, name):
+        # Override to finish up after a script's handler for event `name` returns
+        pass
+
+    def _wrap_event(self, name, register):
+        def registration(*args):
+            # args is (callback,) or (condition, callback), like the SDK's when_* methods
+            *condition, callback = args
+
+            @functools.wraps(callback)
+            async def handler(*_):
+                self._on_event(name)
+                await callback(self)
+                await self._after_event(name)
+
+            return register(*condition, handler)
+        return registration
@@ -0,0 +1,154 @@
+# One background task that reads the IR proximity sensors and pose for every behavior,
+# instead of each loop issuing its own BLE requests. Behaviors asking within the same
+# period share one reading, and nothing is read while nobody is asking.
+#
+#     hub = SensorHub(robot, rate=10, pose=False)
+#
+#     @event(robot.when_play)
+#     async def behavior(robot):
+#         while not STOP:
+#             readings = (await hub.latest()).ir   # only the first call waits
+#             ...
+#             await robot.wait(0.1)
+#         hub.stop()
+#
+# latest() hands back the newest sample right away if it is less than one period old,
+# otherwise it waits for the read it triggers (one round trip, as before). next() always
+# waits for a new sample, for loops that have no wait of their own. After a turn, call
+# invalidate() so only samples requested after the turn are handed out.
+#
+# readSnapshot(robot) is the same read without a hub: IR and pose requested together,
+# for a control tick that wants both for the price of one round trip.
+
+import asyncio
+
+
+class SensorSample:
+    # One reading: when it was requested (event loop seconds), a running count,
+    # the 7 IR proximity values (None if not polled) and the pose (None if not polled)
+    __slots__ = ("time", "seq", "ir", "pose")
+
+    def __init__(self, time, seq, ir, pose):
+        self.time = time
+        self.seq = seq
+        self.ir = ir
+        self.pose = pose
+
+
+async def readSnapshot(robot, ir=True, pose=True):
+    # Requests the IR readings and the pose at the same time and returns them as one
+    # SensorSample stamped with the request time (seq 0). Unrequested fields are None.
+    requested = asyncio.get_running_loop().time()
+    requests = []
+    if ir:
+        requests.append(robot.get_ir_proximity())
+    if pose:
+        requests.append(robot.get_position())
+    results = await asyncio.gather(*requests)
+    ir_reading = results.pop(0).sensors if ir else None
+    pose_reading = results.pop(0) if pose else None
+    return SensorSample(requested, 0, ir_reading, pose_reading)
+
+
+class SensorHub:
+    def __init__(self, robot, rate=10.0, ir=True, pose=True):
+        # rate: most samples per second; ir/pose: which readings each sample includes
+        self.robot = robot
+        self.period = 1.0 / rate
+        self.read_ir = ir
+        self.read_pose = pose
+        self.sample = None       # newest SensorSample
+        self.reads = 0           # SDK requests issued so far
+        self._task = None
+        self._waiters = []       # futures of callers waiting for the next sample
+        self._demand = asyncio.Event()
+        self._fresh_after = float('-inf')
+        self._error = None
+
+    def start(self):
+        # Starts polling (again, after a failure). Needs a running event loop, so it
+        # happens on the first latest()/next() call from a robot event handler unless
+        # called earlier.
+        if self._task is None or self._task.done():
+            self._error = None
+            self._task = asyncio.get_running_loop().create_task(self._poll())
+        return self
+
+    def stop(self):
+        # Stops polling; waiting callers are cancelled
+        if self._task is not None:
+            self._task.cancel()
+            self._task = None
+        for future in self._waiters:
+            future.cancel()
+        self._waiters = []
+
+    def invalidate(self):
+        # Makes the next latest()/next() wait for a sample requested from now on
+        self._fresh_after = asyncio.get_running_loop().time()
+
+    def peek(self):
+        # Newest sample without waiting, or None
+        return self.sample
+
+    async def latest(self):
+        # Newest sample, waiting for a new one only if it is a period old or predates
+        # invalidate()
+        sample = self.sample
+        if (sample is not None and sample.time >= self._fresh_after
+                and asyncio.get_running_loop().time() - sample.time < self.period):
+            return sample
+        return await self.next()
+
+    async def next(self):
+        # Waits for the next sample to be published (and to be fresh, see invalidate())
+        while True:
+            sample = await self._wait()
+            if sample.time >= self._fresh_after:
+                return sample
+
+    async def _wait(self):
+        # a poller that failed stays failed: its error is raised until start() is called
+        if self._error is not None:
+            raise self._error
+        self.start()
+        future = asyncio.get_running_loop().create_future()
+        self._waiters.append(future)
+        self._demand.set()
+        return await future
+
+    async def _poll(self):
+        loop = asyncio.get_running_loop()
+        seq = 0
+        requested = float('-inf')
+        try:
+            while True:
+                # read only when someone is waiting, and no more often than the rate
+                await self._demand.wait()
+                self._demand.clear()
+                if not self._waiters:
+                    continue  # served by the read that was already under way
+                await asyncio.sleep(max(0.0, requested + self.period - loop.time()))
+
+                sample = await readSnapshot(self.robot, self.read_ir, self.read_pose)
+                requested = sample.time
+                self.reads += self.read_ir + self.read_pose
+                seq += 1
+                sample.seq = seq
+                self._publish(sample)
+        except asyncio.CancelledError:
+            raise
+        except Exception as error:
+            # hand the failure to whoever is waiting instead of losing it in the task
+            self._error = error
+            waiters, self._waiters = self._waiters, []
+            for future in waiters:
+                if not future.done():
+                    future.set_exception(error)
+
+    def _publish(self, sample):
+        self.sample = sample
+        waiters, self._waiters = self._waiters, []
+        for future in waiters:
+            if not future.done():
+                future.set_result(sample)
@@ -0,0 +1,295 @@
+# Records a robot session to a file and plays it back later without the robot.
+#
+# Recording: set CS1301_RECORD to a file name and run a lab script as usual (on the real
+# robot or the simulator). Every SDK call is written as one JSON line with its start time,
+# duration, arguments and response (IR readings, pose, ...), and every event handler that
+# fires (when_play, when_bumped, when_touched) is written with its time, e.g.
+#     CS1301_RECORD=delivery.jsonl python AutonomousDelivery.py
+#
+# Replay: set CS1301_REPLAY to the file instead. The script then talks to a ReplayCreate3,
+# which hands back the recorded responses in order (per method) after the recorded
+# delay, and fires the recorded events at their recorded times, all on the simulator's
+# virtual clock, so the run finishes at CPU speed and comes out the same every time:
+#     CS1301_REPLAY=delivery.jsonl python AutonomousDelivery.py
+# A call whose arguments differ from the recording (the controller has changed since)
+# still gets the recorded response; replay.divergences counts them and the first few
+# are printed. When a method's responses run out the replay stops (replay.exhausted).
+#
+# Line format: the first line is {"type": "session", "version": 1, "started": wall clock}.
+# Then {"type": "call", "seq", "t", "dt", "method", "args", "result"} with "error" instead
+# of "result" if the call raised, and {"type": "event", "t", "event", "handler"} where
+# handler counts the script's event registrations in order. Times are seconds since the
+# session started; results are {"ir": [...]}, {"pose": [x, y, heading]} or plain values.
+
+import asyncio
+import functools
+import json
+import time
+from collections import defaultdict, deque
+
+from robotProxy import RobotProxy
+from simRobot import Arena, SimCreate3, SimIrProximity, SimPose
+
+SESSION_VERSION = 1
+FLUSH_EVERY = 100           # lines written between flushes to disk
+MAX_DIVERGENCE_REPORTS = 5
+
+
+def encodeResult(result):
+    if result is None or isinstance(result, (bool, int, float, str)):
+        return result
+    if hasattr(result, "sensors"):
+        return {"ir": list(result.sensors)}
+    if all(hasattr(result, name) for name in ("x", "y", "heading")):
+        return {"pose": [result.x, result.y, result.heading]}
+    if isinstance(result, (list, tuple)):
+        return [encodeResult(value) for value in result]
+    return repr(result)
+
+
+def decodeResult(value):
+    if isinstance(value, dict):
+        if "ir" in value:
+            return SimIrProximity(value["ir"])
+        if "pose" in value:
+            return SimPose(*value["pose"])
+    return value
+
+
+class SessionRecorder(RobotProxy):
+    def __init__(self, robot, path):
+        super().__init__(robot)
+        self.path = path
+        self.calls = 0
+        self._file = open(path, "w")
+        self._unflushed = 0
+        self._start = None
+        self._handlers = 0
+        self._write({"type": "session", "version": SESSION_VERSION, "started": time.time()})
+
+    def play(self):
+        try:
+            return self.inner.play()
+        finally:
+            self.close()
+
+    def close(self):
+        if not self._file.closed:
+            self._file.close()
+
+    def _now(self):
+        now = asyncio.get_running_loop().time()
+        if self._start is None:
+            self._start = now
+        return now - self._start
+
+    def _write(self, record):
+        if self._file.closed:
+            return
+        self._file.write(json.dumps(record) + "\n")
+        self._unflushed += 1
+        if self._unflushed >= FLUSH_EVERY or record["type"] == "event":
+            self._file.flush()   # so a crashed run still leaves most of its trace
+            self._unflushed = 0
+
+    def _wrap_call(self, name, method):
+        async def call(*args, **kwargs):
+            seq = self.calls
+            self.calls += 1
+            start = self._now()
+            record = {"type": "call", "seq": seq, "t": start, "method": name,
+                      "args": [encodeResult(arg) for arg in args]}
+            if kwargs:
+                record["kwargs"] = {key: encodeResult(value) for key, value in kwargs.items()}
+            try:
+                result = await method(*args, **kwargs)
+            except Exception as error:
+                record["dt"] = self._now() - start
+                record["error"] = repr(error)
+                self._write(record)
+                raise
+            record["dt"] = self._now() - start
+            record["result"] = encodeResult(result)
+            self._write(record)
+            return result
+        return call
+
+    def _wrap_event(self, name, register):
+        registration = super()._wrap_event(name, register)
+
+        def numbered_registration(*args):
+            *condition, callback = args
+            handler = self._handlers
+            self._handlers += 1
+
+            @functools.wraps(callback)
+            async def logged(robot):
+                self._write({"type": "event", "t": self._now(), "event": name, "handler": handler})
+                await callback(robot)
+
+            return registration(*condition, logged)
+        return numbered_registration
+
+
+def loadSession(path):
+    # (call records grouped by method in start order, event records in time order)
+    calls = defaultdict(list)
+    events = []
+    with open(path) as f:
+        header = json.loads(f.readline() or "{}")
+        if header.get("type") != "session" or header.get("version") != SESSION_VERSION:
+            raise ValueError("{} is not a recorded robot session".format(path))
+        for line in f:
+            if not line.strip():
+                continue
+            try:
+                record = json.loads(line)
+            except ValueError:
+                break   # last line cut short by a crash
+            if record["type"] == "call":
+                calls[record["method"]].append(record)
+            elif record["type"] == "event":
+                events.append(record)
+    for records in calls.values():
+        records.sort(key=lambda record: record["seq"])
+    events.sort(key=lambda record: record["t"])
+    return calls, events
+
+
+class ReplayExhausted(RuntimeError):
+    pass
+
+
+class ReplayCreate3(SimCreate3):
+    # Stands in for the robot, answering from a recorded session on a virtual clock
+
+    def __init__(self, path, max_time=3600.0):
+        super().__init__(Arena(), latency=0, max_time=max_time)
+        calls, self._events = loadSession(path)
+        self._responses = {method: deque(records) for method, records in calls.items()}
+        self._handlers = []       # every registered callback, in registration order
+        self.replayed = 0
+        self.divergences = 0
+        self.exhausted = False
+
+    def when_play(self, callback):
+        self._handlers.append(callback)
+        super().when_play(callback)
+
+    def when_bumped(self, condition, callback):
+        self._handlers.append(callback)
+        super().when_bumped(condition, callback)
+
+    def when_touched(self, condition, callback):
+        self._handlers.append(callback)
+        super().when_touched(condition, callback)
+
+    def play(self):
+        try:
+            super().play()
+        except ReplayExhausted as error:
+            self.exhausted = True
+            print("Replay finished: {}".format(error))
+
+    async def _main(self, loop):
+        # when_play handlers start as usual; the other events fire when they did
+        for record in self._events:
+            if record["event"] != "when_play" and record["handler"] < len(self._handlers):
+                loop.call_at(loop.time() + record["t"], self._fire_recorded, record["handler"])
+        await super()._main(loop)
+
+    async def _physics(self):
+        pass   # the pose comes from the recording, nothing to simulate
+
+    def _fire_recorded(self, handler):
+        callback = self._handlers[handler]
+        if callback not in self._running:
+            self._spawn(self._run_event(callback))
+
+    async def _replay(self, method, *args):
+        responses = self._responses.get(method)
+        if not responses:
+            for task in self._tasks:
+                if task is not asyncio.current_task():
+                    task.cancel()
+            raise ReplayExhausted("no more recorded {} calls".format(method))
+        record = responses.popleft()
+        self.calls += 1
+        self.replayed += 1
+        if json.loads(json.dumps([encodeResult(arg) for arg in args])) != record["args"]:
+            self.divergences += 1
+            if self.divergences <= MAX_DIVERGENCE_REPORTS:
+                print("Replay: {}{} at {:.2f} s was recorded as {}{}".format(
+                    method, tuple(args), self.time, method, tuple(record["args"])))
+        await asyncio.sleep(record.get("dt", 0))
+        if "error" in record:
+            raise RuntimeError("recorded {} failed: {}".format(method, record["error"]))
+        return decodeResult(record.get("result"))
+
+    # === SDK calls, answered from the recording
+
+    async def wait(self, seconds):
+        await asyncio.sleep(seconds)
+
+    async def stop(self):
+        return await self._replay("stop")
+
+    async def set_wheel_speeds(self, left, right):
+        return await self._replay("set_wheel_speeds", left, right)
+
+    async def set_left_speed(self, speed):
+        return await self._replay("set_left_speed", speed)
+
+    async def set_right_speed(self, speed):
+        return await self._replay("set_right_speed", speed)
+
+    async def move(self, distance):
+        return await self._replay("move", distance)
+
+    async def turn_left(self, angle):
+        return await self._replay("turn_left", angle)
+
+    async def turn_right(self, angle):
+        return await self._replay("turn_right", angle)
+
+    async def reset_navigation(self):
+        return await self._replay("reset_navigation")
+
+    async def get_position(self):
+        pose = await self._replay("get_position")
+        self.x, self.y, self.heading = pose.x, pose.y, pose.heading
+        return pose
+
+    async def get_ir_proximity(self):
+        return await self._replay("get_ir_proximity")
+
+    async def set_lights(self, pattern, red, green, blue):
+        self.lights = (pattern, red, green, blue)
+        return await self._replay("set_lights", pattern, red, green, blue)
+
+    async def set_lights_off(self):
+        self.lights = ("off", 0, 0, 0)
+        return await self._replay("set_lights_off")
+
+    async def set_lights_rgb(self, red, green, blue):
+        self.lights = ("on", red, green, blue)
+        return await self._replay("set_lights_rgb", red, green, blue)
+
+    async def set_lights_on_rgb(self, red, green, blue):
+        self.lights = ("on", red, green, blue)
+        return await self._replay("set_lights_on_rgb", red, green, blue)
+
+    async def set_lights_blink_rgb(self, red, green, blue):
+        self.lights = ("blink", red, green, blue)
+        return await self._replay("set_lights_blink_rgb", red, green, blue)
+
+    async def set_lights_spin_rgb(self, red, green, blue):
+        self.lights = ("spin", red, green, blue)
+        return await self._replay("set_lights_spin_rgb", red, green, blue)
+
+    async def play_note(self, frequency, duration):
+        self.notes.append((self.time, frequency, duration))
+        return await self._replay("play_note", frequency, duration)
+
+    async def stop_sound(self):
+        return await self._replay("stop_sound")
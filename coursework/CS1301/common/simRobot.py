@@ -0,0 +1,477 @@
+# Headless stand-in for the iRobot Create 3 so the lab scripts can run without a robot.
+#
+# SimCreate3 implements the SDK calls the labs use (IR proximity, position, wheel speeds,
+# move/turn, wait, lights, notes and the when_play/when_bumped/when_touched events) against
+# an Arena of wall segments. Everything runs on a virtual clock: robot.wait(0.1) costs no
+# real time, so a run that takes minutes on the floor finishes in a fraction of a second.
+#
+# Arena files are plain text, one statement per line ('#' starts a comment):
+#     start X Y HEADING        robot start pose in arena coordinates (cm, degrees)
+#     wall X1 Y1 X2 Y2         a wall segment
+#     box X1 Y1 X2 Y2          a rectangular obstacle (four walls)
+#     maze CELL_DIM            an ASCII maze follows, ended by a line with just "end"
+#     +--+--+
+#     |     |                  cell (0, 0) is the bottom-left cell, north is up
+#     +  +--+
+#     |     |
+#     +--+--+
+#     end
+# Without a start line the robot starts in the middle of maze cell (0, 0) facing north,
+# or at the origin facing north if there is no maze.
+
+import asyncio
+import math
+import os
+import runpy
+import selectors
+import sys
+
+import robotBackend
+from irProcessing import IR_RANGE as SENSOR_RANGE
+
+IR_ANGLES = [-65.3, -38.0, -20.0, -3.0, 14.25, 34.0, 65.3]
+
+
+class VirtualTimeLoop(asyncio.SelectorEventLoop):
+    # Event loop whose clock jumps straight to the next timer whenever nothing is ready to run
+    def __init__(self):
+        self._now = 0.0
+        super().__init__(_VirtualSelector(self))
+
+    def time(self):
+        return self._now
+
+
+class _VirtualSelector(selectors.DefaultSelector):
+    # Polls real file descriptors without blocking and fast-forwards the loop's clock instead
+    def __init__(self, loop):
+        super().__init__()
+        self._loop = loop
+
+    def select(self, timeout=None):
+        events = super().select(0)
+        if not events and timeout is not None and timeout > 0:
+            self._loop._now += timeout
+        return events
+
+
+class Arena:
+    # Wall segments the simulated robot can see and bump into
+    def __init__(self, walls=(), start=(0.0, 0.0, 90.0)):
+        self.walls = [tuple(float(v) for v in wall) for wall in walls]
+        self.start = tuple(float(v) for v in start)
+
+    @classmethod
+    def fromFile(cls, path):
+        # Reads an arena description (see the top of this file for the format)
+        with open(path) as f:
+            return cls.fromText(f.read())
+
+    @classmethod
+    def fromText(cls, text):
+        walls = []
+        start = None
+        maze_start = None
+        lines = iter(text.splitlines())
+        for line in lines:
+            words = line.split("#", 1)[0].split()
+            if not words:
+                continue
+            keyword, values = words[0], words[1:]
+            if keyword == "start":
+                start = tuple(float(v) for v in values)
+            elif keyword == "wall":
+                walls.append(tuple(float(v) for v in values))
+            elif keyword == "box":
+                x1, y1, x2, y2 = (float(v) for v in values)
+                walls += [(x1, y1, x2, y1), (x2, y1, x2, y2), (x2, y2, x1, y2), (x1, y2, x1, y1)]
+            elif keyword == "maze":
+                cell_dim = float(values[0])
+                rows = []
+                for row in lines:
+                    if row.strip() == "end":
+                        break
+                    rows.append(row)
+                walls += mazeWalls(rows, cell_dim)
+                maze_start = (cell_dim / 2, cell_dim / 2, 90.0)
+            else:
+                raise ValueError(f"unknown arena statement {keyword!r} in line {line!r}")
+
+        if start is None:
+            start = maze_start or (0.0, 0.0, 90.0)
+        return cls(walls, start)
+
+    def ray_distance(self, x, y, angle, max_range):
+        # Distance from (x, y) along angle (degrees) to the nearest wall, or max_range
+        dx = math.cos(math.radians(angle))
+        dy = math.sin(math.radians(angle))
+        best = max_range
+        for x1, y1, x2, y2 in self.walls:
+            ex, ey = x2 - x1, y2 - y1
+            denom = dx * ey - dy * ex
+            if abs(denom) < 1e-12:
+                continue  # parallel
+            wx, wy = x1 - x, y1 - y
+            t = (wx * ey - wy * ex) / denom      # along the ray
+            u = (wx * dy - wy * dx) / denom      # along the wall
+            if 0 <= t < best and 0 <= u <= 1:
+                best = t
+        return best
+
+    def nearest_wall_point(self, x, y):
+        # Closest point on any wall to (x, y) and its distance, or (None, inf) with no walls
+        best_point, best_dist = None, float('inf')
+        for x1, y1, x2, y2 in self.walls:
+            ex, ey = x2 - x1, y2 - y1
+            length_sq = ex * ex + ey * ey
+            t = 0.0 if length_sq == 0 else max(0.0, min(1.0, ((x - x1) * ex + (y - y1) * ey) / length_sq))
+            px, py = x1 + t * ex, y1 + t * ey
+            dist = math.hypot(x - px, y - py)
+            if dist < best_dist:
+                best_point, best_dist = (px, py), dist
+        return best_point, best_dist
+
+
+def mazeWalls(rows, cellDim):
+    # Converts an ASCII maze ("+--+" wall rows and "|  |" cell rows) into wall segments
+    rows = [row.rstrip() for row in rows if row.strip()]
+    n_y = (len(rows) - 1) // 2
+    walls = []
+    for r, row in enumerate(rows):
+        if r % 2 == 0:
+            # horizontal walls along y = (n_y - r / 2) * cellDim
+            y = (n_y - r // 2) * cellDim
+            for c in range((len(row) - 1) // 3):
+                if row[3 * c + 1:3 * c + 3] == "--":
+                    walls.append((c * cellDim, y, (c + 1) * cellDim, y))
+        else:
+            # vertical walls beside cell row y = n_y - 1 - r // 2
+            y = (n_y - 1 - r // 2) * cellDim
+            for c in range(0, len(row), 3):
+                if row[c] == "|":
+                    x = (c // 3) * cellDim
+                    walls.append((x, y, x, y + cellDim))
+    return walls
+
+
+class SimPose:
+    # Same fields as the SDK's Pose
+    def __init__(self, x=0.0, y=0.0, heading=90.0):
+        self.x = x
+        self.y = y
+        self.heading = heading
+
+    def __str__(self):
+        return f"Pose ({self.x:.2f}, {self.y:.2f}, {self.heading:.1f}°)"
+
+
+class SimIrProximity:
+    # Same fields as the SDK's IrProximity
+    def __init__(self, sensors):
+        self.sensors = sensors
+
+
+class SimCreate3:
+    # Simulated Create 3 driving around an Arena on a virtual clock
+    RADIUS = 17.0           # cm, body radius used for collisions
+    WHEEL_BASE = 23.5       # cm between the wheels
+    MAX_SPEED = 30.6        # cm/s, same limit as the real robot
+    MOVE_SPEED = 20.0       # cm/s used by move()
+    TURN_RATE = 90.0        # deg/s used by turn_left()/turn_right()
+    IR_RANGE = SENSOR_RANGE  # cm from the sensor, beyond this the IR sensors read 0
+
+    def __init__(self, arena, latency=0.02, physics_step=0.05, max_time=600.0):
+        # latency: virtual seconds every SDK call takes, like a BLE round trip
+        # max_time: virtual seconds after which play() gives up on the when_play handlers
+        self.arena = arena
+        self.latency = latency
+        self.physics_step = physics_step
+        self.max_time = max_time
+
+        self._when_play = []
+        self._when_bumped = []
+        self._when_touched = []
+        self._running = set()
+        self._tasks = set()
+        self._scheduled_touches = []
+        self._loop = None
+
+        self.x, self.y, self.heading = arena.start
+        self._origin = arena.start
+        self._left = 0.0
+        self._right = 0.0
+        self._updated = 0.0
+        self._in_contact = False
+        self._moving = None
+
+        # what the robot did, for checking a run afterwards
+        self.lights = None      # (pattern, red, green, blue)
+        self.notes = []         # (time, frequency, duration)
+        self.bumps = 0
+        self.calls = 0
+        self.timed_out = False
+        self.script_globals = None
+
+    # === Events
+
+    def when_play(self, callback):
+        self._when_play.append(callback)
+
+    def when_bumped(self, condition, callback):
+        self._when_bumped.append((condition, callback))
+
+    def when_touched(self, condition, callback):
+        self._when_touched.append((condition, callback))
+
+    def schedule_touch(self, at, front_left=True, front_right=False):
+        # Presses the touch buttons at virtual time `at` during play()
+        self._scheduled_touches.append((at, front_left, front_right))
+
+    def touch(self, front_left=True, front_right=False):
+        # Presses the touch buttons now; only valid while play() is running
+        self._fire(self._when_touched, front_left, front_right)
+
+    def _fire(self, handlers, left, right):
+        # Starts every matching handler that is not already running, like the SDK does
+        for condition, callback in handlers:
+            matched = (left or right) if not condition else (
+                (condition[0] and left) or (len(condition) > 1 and condition[1] and right))
+            if matched and callback not in self._running:
+                self._spawn(self._run_event(callback))
+
+    async def _run_event(self, callback):
+        self._running.add(callback)
+        try:
+            await callback(self)
+        finally:
+            self._running.discard(callback)
+
+    def _spawn(self, coro):
+        task = self._loop.create_task(coro)
+        self._tasks.add(task)
+        task.add_done_callback(self._tasks.discard)
+        return task
+
+    # === Running
+
+    @property
+    def time(self):
+        # Virtual seconds since play() started
+        return self._loop.time() if self._loop else self._updated
+
+    def play(self):
+        # Runs every when_play handler on a virtual clock until they finish or max_time passes
+        loop = VirtualTimeLoop()
+        try:
+            loop.run_until_complete(self._main(loop))
+        finally:
+            loop.close()
+            self._loop = None
+
+    async def _main(self, loop):
+        self._loop = loop
+        self._updated = loop.time()
+        physics = loop.create_task(self._physics())
+        for at, front_left, front_right in self._scheduled_touches:
+            loop.call_at(at, self.touch, front_left, front_right)
+
+        handlers = [self._spawn(callback(self)) for callback in self._when_play]
+        try:
+            if handlers:
+                _, pending = await asyncio.wait(handlers, timeout=self.max_time)
+                self.timed_out = bool(pending)
+        finally:
+            # also catches background tasks the script started itself (e.g. a SensorHub)
+            leftovers = [task for task in asyncio.all_tasks(loop)
+                         if task is not asyncio.current_task()]
+            for task in leftovers:
+                task.cancel()
+            await asyncio.gather(*leftovers, return_exceptions=True)
+
+        for task in handlers:
+            if not task.cancelled() and task.exception() is not None:
+                raise task.exception()
+
+    async def _physics(self):
+        # Keeps the pose and bumpers up to date even while the scripts are only waiting.
+        # Sleeps until the wheels are told to move, so a parked robot costs nothing.
+        while True:
+            if self._left == 0 and self._right == 0:
+                self._moving = self._loop.create_future()
+                await self._moving
+            await asyncio.sleep(self.physics_step)
+            self._advance()
+
+    async def _round_trip(self):
+        self.calls += 1
+        if self.latency:
+            await asyncio.sleep(self.latency)
+
+    # === Motion model
+
+    def _advance(self):
+        # Integrates the differential drive from the last update to now
+        now = self.time
+        remaining = now - self._updated
+        self._updated = now
+        if self._left == 0 and self._right == 0:
+            return
+        while remaining > 1e-9:
+            dt = min(remaining, self.physics_step)
+            remaining -= dt
+            self._step(dt)
+
+    def _step(self, dt):
+        v = (self._left + self._right) / 2
+        w = (self._right - self._left) / self.WHEEL_BASE     # rad/s, counter-clockwise
+        heading = math.radians(self.heading)
+        if abs(w) < 1e-9:
+            x = self.x + v * dt * math.cos(heading)
+            y = self.y + v * dt * math.sin(heading)
+        else:
+            r = v / w
+            x = self.x + r * (math.sin(heading + w * dt) - math.sin(heading))
+            y = self.y - r * (math.cos(heading + w * dt) - math.cos(heading))
+        self.heading = (self.heading + math.degrees(w * dt)) % 360
+
+        point, dist = self.arena.nearest_wall_point(x, y)
+        if dist >= self.RADIUS:
+            self.x, self.y = x, y
+            self._in_contact = False
+            return
+
+        # blocked by a wall: stay put and press the bumper on the side that touched
+        if not self._in_contact:
+            self._in_contact = True
+            contact = math.degrees(math.atan2(point[1] - self.y, point[0] - self.x))
+            side = (contact - self.heading + 180) % 360 - 180
+            left, right = -15 <= side <= 100, -100 <= side <= 15
+            if left or right:
+                self.bumps += 1
+                self._fire(self._when_bumped, left, right)
+
+    def _set_motion(self, left, right):
+        self._advance()
+        self._left = max(-self.MAX_SPEED, min(self.MAX_SPEED, left))
+        self._right = max(-self.MAX_SPEED, min(self.MAX_SPEED, right))
+        if (self._left or self._right) and self._moving is not None and not self._moving.done():
+            self._moving.set_result(None)
+
+    # === SDK calls
+
+    async def wait(self, seconds):
+        await asyncio.sleep(seconds)
+
+    async def stop(self):
+        await self._round_trip()
+        self._set_motion(0, 0)
+
+    async def set_wheel_speeds(self, left, right):
+        await self._round_trip()
+        self._set_motion(left, right)
+
+    async def set_left_speed(self, speed):
+        await self._round_trip()
+        self._set_motion(speed, self._right)
+
+    async def set_right_speed(self, speed):
+        await self._round_trip()
+        self._set_motion(self._left, speed)
+
+    async def move(self, distance):
+        await self._round_trip()
+        speed = math.copysign(self.MOVE_SPEED, distance)
+        self._set_motion(speed, speed)
+        await asyncio.sleep(abs(distance) / self.MOVE_SPEED)
+        self._set_motion(0, 0)
+        return await self.get_position()
+
+    async def turn_left(self, angle):
+        await self._round_trip()
+        wheel = math.radians(self.TURN_RATE) * self.WHEEL_BASE / 2
+        wheel = math.copysign(wheel, angle)
+        self._set_motion(-wheel, wheel)
+        await asyncio.sleep(abs(angle) / self.TURN_RATE)
+        self._set_motion(0, 0)
+        return await self.get_position()
+
+    async def turn_right(self, angle):
+        return await self.turn_left(-angle)
+
+    async def reset_navigation(self):
+        await self._round_trip()
+        self._advance()
+        self._origin = (self.x, self.y, self.heading)
+
+    async def get_position(self):
+        # Pose relative to where the robot started, which is reported as (0, 0) facing 90
+        await self._round_trip()
+        self._advance()
+        sx, sy, sheading = self._origin
+        rotation = math.radians(90 - sheading)
+        dx, dy = self.x - sx, self.y - sy
+        return SimPose(dx * math.cos(rotation) - dy * math.sin(rotation),
+                       dx * math.sin(rotation) + dy * math.cos(rotation),
+                       (self.heading + 90 - sheading) % 360)
+
+    async def get_ir_proximity(self):
+        # Raw 0-4095 readings, the inverse of the labs' 4095 / (reading + 1) distance.
+        # The sensors sit on the bumper and point straight out from the robot's center.
+        await self._round_trip()
+        self._advance()
+        sensors = []
+        for angle in IR_ANGLES:
+            direction = math.radians(self.heading - angle)
+            dist = self.arena.ray_distance(self.x + self.RADIUS * math.cos(direction),
+                                           self.y + self.RADIUS * math.sin(direction),
+                                           math.degrees(direction), self.IR_RANGE)
+            reading = 0 if dist >= self.IR_RANGE else round(4095 / max(dist, 1.0) - 1)
+            sensors.append(max(0, min(4095, reading)))
+        return SimIrProximity(sensors)
+
+    async def set_lights(self, pattern, red, green, blue):
+        await self._round_trip()
+        self.lights = (pattern, red, green, blue)
+
+    async def set_lights_off(self):
+        await self.set_lights("off", 0, 0, 0)
+
+    async def set_lights_rgb(self, red, green, blue):
+        await self.set_lights("on", red, green, blue)
+
+    async def set_lights_on_rgb(self, red, green, blue):
+        await self.set_lights("on", red, green, blue)
+
+    async def set_lights_blink_rgb(self, red, green, blue):
+        await self.set_lights("blink", red, green, blue)
+
+    async def set_lights_spin_rgb(self, red, green, blue):
+        await self.set_lights("spin", red, green, blue)
+
+    async def play_note(self, frequency, duration):
+        # Like the real robot, returns once the note has finished
+        await self._round_trip()
+        self.notes.append((self.time, frequency, duration))
+        await asyncio.sleep(duration)
+
+    async def stop_sound(self):
+        await self._round_trip()
+
+
+def runScript(scriptPath, arena, **simOptions):
+    # Runs a lab script against a SimCreate3 and returns the robot after play() finishes.
+    # arena is an Arena or the path of an arena file. The script's globals are kept in
+    # robot.script_globals so a caller can look at its flags and maze afterwards.
+    if not isinstance(arena, Arena):
+        arena = Arena.fromFile(arena)
+    robot = SimCreate3(arena, **simOptions)
+    previous = robotBackend.SIMULATOR
+    robotBackend.SIMULATOR = lambda name: robot
+    # like `python script.py`, let the script import modules that sit next to it
+    sys.path.insert(0, os.path.dirname(os.path.abspath(scriptPath)))
+    try:
+        robot.script_globals = runpy.run_path(scriptPath, run_name="__main__")
+    finally:
+        sys.path.pop(0)
+        robotBackend.SIMULATOR = previous
+    return robot
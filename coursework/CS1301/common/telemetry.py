@@ -0,0 +1,287 @@
+# Records pose, IR and wheel command samples during a run without touching the disk on
+# every tick. Samples are buffered in memory column by column and written in blocks by a
+# background task, to a small binary file that is rotated once it grows past max_bytes.
+#
+#     telemetry = TelemetryRecorder("DeliveryTelemetry.tlm")
+#     robot = RecordingRobot(makeRobot("DANNY-BOT"), telemetry)   # records as it goes
+#     ...
+#     telemetry.close()
+#     exportCsv("DeliveryTelemetry.tlm", "PositionData.csv")        # x,y for PointGraph
+#
+# Samples can also be added by hand with record_pose/record_ir/record_command. With
+# csv_path set, the poses of every block written are also appended to that file as x,y
+# rows, so PointGraph --follow can watch the run while it happens.
+#
+# File format (little-endian): a header of magic b"TELM", version (u8) and the wall
+# clock start time (f64), then blocks. Each block is a row count n (u32) followed by
+# the columns: t (n x f64, seconds since the recording started), kind (n x u8), then
+# v0..v6 (7 columns of n x f32; unused values are NaN).
+# When the file rotates it becomes path.1 (path.1 becomes path.2, ...), keeping
+# `backups` old files. The first sample opens the file and clears the files of the
+# previous recording, so making a recorder touches nothing on disk.
+
+import asyncio
+import math
+import os
+import struct
+import sys
+import time
+from array import array
+
+try:
+    import numpy as np  # only needed by loadColumns
+except ImportError:
+    np = None
+
+from robotProxy import RobotProxy
+
+TELEMETRY_MAGIC = b"TELM"
+TELEMETRY_VERSION = 1
+FILE_HEADER = struct.Struct("<4sBd")
+BLOCK_HEADER = struct.Struct("<I")
+N_VALUES = 7
+
+KIND_POSE, KIND_IR, KIND_COMMAND = range(3)
+KIND_COLUMNS = (("x", "y", "heading"),
+                ("ir0", "ir1", "ir2", "ir3", "ir4", "ir5", "ir6"),
+                ("left", "right"))
+
+NAN = float('nan')
+
+
+class TelemetryRecorder:
+    def __init__(self, path, max_bytes=1 << 20, backups=3, batch_size=256, flush_interval=1.0,
+                 csv_path=None):
+        # batch_size: rows that trigger a write; flush_interval: most seconds between writes
+        self.path = path
+        self.csv_path = csv_path
+        self.max_bytes = max_bytes
+        self.backups = backups
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self.records = 0         # rows recorded so far
+        self.blocks = 0          # blocks written so far
+        self.rotations = 0
+        self._start = None       # event loop time of the first sample
+        self._columns = self._new_columns()
+        self._file = None
+        self._closed = False
+        self._task = None
+        self._full = None
+        self._error = None
+
+    def record_pose(self, pose):
+        self.record(KIND_POSE, pose.x, pose.y, pose.heading)
+
+    def record_ir(self, readings):
+        self.record(KIND_IR, *readings)
+
+    def record_command(self, left, right):
+        self.record(KIND_COMMAND, left, right)
+
+    def record(self, kind, *values):
+        # Buffers one sample; called from inside the robot's event loop
+        if self._error is not None:
+            raise self._error
+        if self._closed:
+            return  # e.g. a stop sent by a bump handler after the run ended
+        if self._file is None:
+            self._begin()
+        loop = asyncio.get_running_loop()
+        if self._task is None:
+            self._full = asyncio.Event()
+            self._task = loop.create_task(self._run())
+            self._start = loop.time()
+
+        t, kinds, values_columns = self._columns
+        t.append(loop.time() - self._start)
+        kinds.append(kind)
+        for i in range(N_VALUES):
+            values_columns[i].append(values[i] if i < len(values) else NAN)
+        self.records += 1
+        if len(t) >= self.batch_size:
+            self._full.set()
+
+    def flush(self):
+        # Writes whatever is buffered right now
+        t, kinds, values_columns = self._columns
+        if not t:
+            return
+        self._columns = self._new_columns()
+        if self.csv_path is not None:
+            self._append_csv(kinds, values_columns)
+        if sys.byteorder == "big":
+            for column in (t, *values_columns):
+                column.byteswap()
+        block = b"".join([BLOCK_HEADER.pack(len(t)), t.tobytes(), kinds.tobytes()]
+                         + [column.tobytes() for column in values_columns])
+        if self._file.tell() > FILE_HEADER.size and self._file.tell() + len(block) > self.max_bytes:
+            self._rotate()
+        self._file.write(block)
+        self._file.flush()
+        self.blocks += 1
+
+    def close(self):
+        # Stops the background task and writes the rest
+        if self._task is not None:
+            self._task.cancel()
+            self._task = None
+        if self._file is not None:
+            self.flush()
+            self._file.close()
+            self._file = None
+        self._closed = True
+
+    def _new_columns(self):
+        return array('d'), array('B'), [array('f') for _ in range(N_VALUES)]
+
+    def _begin(self):
+        # Clears the previous recording's files and starts this one
+        for n in range(1, self.backups + 1):
+            if os.path.exists("{}.{}".format(self.path, n)):
+                os.remove("{}.{}".format(self.path, n))
+        self._open()
+
+    def _open(self):
+        self._file = open(self.path, "wb")
+        self._file.write(FILE_HEADER.pack(TELEMETRY_MAGIC, TELEMETRY_VERSION, time.time()))
+
+    def _append_csv(self, kinds, values_columns):
+        rows = ["{:.6g},{:.6g}\n".format(x, y)
+                for kind, x, y in zip(kinds, values_columns[0], values_columns[1])
+                if kind == KIND_POSE]
+        if rows:
+            with open(self.csv_path, "a") as f:
+                f.writelines(rows)
+
+    def _rotate(self):
+        self._file.close()
+        if self.backups > 0:
+            for n in range(self.backups - 1, 0, -1):
+                if os.path.exists("{}.{}".format(self.path, n)):
+                    os.replace("{}.{}".format(self.path, n), "{}.{}".format(self.path, n + 1))
+            os.replace(self.path, self.path + ".1")
+        self._open()
+        self.rotations += 1
+
+    async def _run(self):
+        try:
+            while True:
+                try:
+                    await asyncio.wait_for(self._full.wait(), self.flush_interval)
+                except asyncio.TimeoutError:
+                    pass
+                self._full.clear()
+                self.flush()
+        except asyncio.CancelledError:
+            raise
+        except Exception as error:
+            # report it from the next record() instead of losing it in the task
+            self._error = error
+
+
+class RecordingRobot(RobotProxy):
+    # Records every pose and IR reading the script asks for and every wheel speed it sets
+    def __init__(self, robot, telemetry):
+        super().__init__(robot)
+        self.telemetry = telemetry
+
+    def _wrap_call(self, name, method):
+        if name == "get_position":
+            async def call(*args, **kwargs):
+                pose = await method(*args, **kwargs)
+                self.telemetry.record_pose(pose)
+                return pose
+        elif name == "get_ir_proximity":
+            async def call(*args, **kwargs):
+                readings = await method(*args, **kwargs)
+                self.telemetry.record_ir(readings.sensors)
+                return readings
+        elif name == "set_wheel_speeds":
+            async def call(left, right):
+                self.telemetry.record_command(left, right)
+                return await method(left, right)
+        else:
+            return method
+        return call
+
+
+def telemetryFiles(path):
+    # The files of one recording, oldest first
+    rotated = []
+    n = 1
+    while os.path.exists("{}.{}".format(path, n)):
+        rotated.append("{}.{}".format(path, n))
+        n += 1
+    return rotated[::-1] + ([path] if os.path.exists(path) else [])
+
+
+def readBlocks(path):
+    # Yields (t, kind, values) per block of one file, each an array; values is a list
+    # of the 7 value columns
+    with open(path, "rb") as f:
+        magic, version, _ = FILE_HEADER.unpack(f.read(FILE_HEADER.size))
+        if magic != TELEMETRY_MAGIC or version != TELEMETRY_VERSION:
+            raise ValueError("{} is not a telemetry file".format(path))
+        while True:
+            header = f.read(BLOCK_HEADER.size)
+            if len(header) < BLOCK_HEADER.size:
+                return
+            n = BLOCK_HEADER.unpack(header)[0]
+            t, kinds, values = array('d'), array('B'), [array('f') for _ in range(N_VALUES)]
+            try:
+                t.frombytes(f.read(8 * n))
+                kinds.frombytes(f.read(n))
+                for column in values:
+                    column.frombytes(f.read(4 * n))
+            except ValueError:
+                return  # block cut short, e.g. the run was killed mid-write
+            if len(t) < n or len(values[-1]) < n:
+                return
+            if sys.byteorder == "big":
+                for column in (t, *values):
+                    column.byteswap()
+            yield t, kinds, values
+
+
+def readRecords(path, kind=None):
+    # Yields (t, kind, values) rows across a recording's rotated files, optionally only
+    # of one kind; values holds just that kind's columns
+    for segment in telemetryFiles(path):
+        for t, kinds, values in readBlocks(segment):
+            for i in range(len(t)):
+                if kind is None or kinds[i] == kind:
+                    width = len(KIND_COLUMNS[kinds[i]])
+                    yield t[i], kinds[i], tuple(values[j][i] for j in range(width))
+
+
+def loadColumns(path, kind):
+    # All samples of one kind across a recording's files as numpy arrays:
+    # (t of shape (N,), values of shape (N, number of columns of that kind)),
+    # e.g. loadColumns(path, KIND_IR) for an (N, 7) array of IR readings
+    width = len(KIND_COLUMNS[kind])
+    times, chunks = [], []
+    for segment in telemetryFiles(path):
+        for t, kinds, values in readBlocks(segment):
+            keep = np.frombuffer(kinds, dtype=np.uint8) == kind
+            times.append(np.frombuffer(t, dtype=np.float64)[keep])
+            chunks.append(np.stack([np.frombuffer(values[j], dtype=np.float32)[keep]
+                                    for j in range(width)], axis=1))
+    if not chunks:
+        return np.empty(0), np.empty((0, width), dtype=np.float32)
+    return np.concatenate(times), np.concatenate(chunks)
+
+
+def exportCsv(path, csv_path, kind=KIND_POSE, columns=("x", "y")):
+    # Writes the given columns of one kind as CSV with a header row (PointGraph skips it)
+    names = KIND_COLUMNS[kind]
+    picks = [names.index(name) for name in columns]
+    rows = 0
+    with open(csv_path, "w") as f:
+        f.write(",".join(columns) + "\n")
+        for _, _, values in readRecords(path, kind):
+            if any(math.isnan(values[i]) for i in picks):
+                continue
+            f.write(",".join(format(values[i], ".6g") for i in picks) + "\n")
+            rows += 1
+    return rows
@@ -1,11 +1,13 @@
 import irobot_edu_sdk
-from irobot_edu_sdk.backend.bluetooth import Bluetooth
 from irobot_edu_sdk.robots import event, hand_over, Color, Robot, Root, Create3
 from irobot_edu_sdk.music import Note
+import os, sys
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "common"))
+from robotBackend import makeRobot  # real robot, or the simulator when CS1301_SIM_ARENA is set
 
 # robot is the instance of the robot that will allow us to call
 # its methods and to define events with the @event decorator.
-robot = Create3(Bluetooth("PAIGE-BOT"))
+robot = makeRobot("PAIGE-BOT")
 
 @event(robot.when_play)
 async def play(robot):
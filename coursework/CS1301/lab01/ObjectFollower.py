@@ -1,9 +1,26 @@
 import irobot_edu_sdk
-from irobot_edu_sdk.backend.bluetooth import Bluetooth
 from irobot_edu_sdk.robots import event, hand_over, Color, Robot, Root, Create3
 from irobot_edu_sdk.music import Note
+import os, sys
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "common"))
+from robotBackend import makeRobot  # real robot, or the simulator when CS1301_SIM_ARENA is set
+from sensorHub import SensorHub
+from feedbackQueue import FeedbackQueue
+from commandCoalescer import CoalescingRobot
+from irProcessing import irDistances
+from controlLoop import PeriodicLoop
 
-robot = Create3(Bluetooth("PAIGE-BOT")) # Put robot name here.
+# repeated wheel speeds and light colours are only sent to the robot when they change
+robot = CoalescingRobot(makeRobot("PAIGE-BOT")) # Put robot name here.
+
+# IR readings shared by the behaviors, read at most 10 times a second
+hub = SensorHub(robot, rate=10, pose=False)
+
+# Status notes play in the background so the follow loop keeps its 0.1 s pace
+feedback = FeedbackQueue(robot)
+
+# followObject runs 10 times a second, however long its reads and commands take
+control = PeriodicLoop(rate=10)
 
 @event(robot.when_play)
 async def play(robot):
@@ -37,7 +54,7 @@ async def when_either_bumped(robot):
 
 # --------------------------------------------------------
 # Implement followObject() so the robot:
-#   - Uses IR proximity readings (4095 / (ir + 1))
+#   - Uses IR proximity readings (4095 / (ir + 1), see common/irProcessing.py)
 #   - Responds to the CENTER sensor:
 #         > 15.0 units ---> plate far
 #         5.0–15.0 units ---> alignment zone
@@ -52,12 +69,13 @@ async def followObject(robot):
     global STOP
     while True:
         if STOP:
+            feedback.stop()
             await robot.set_wheel_speeds(0,0)
             await robot.set_lights_rgb(255,0,0)
             break
         
-        distances = (await robot.get_ir_proximity()).sensors
-        proximity = [4095 / (ir + 1) for ir in distances]
+        distances = (await hub.latest()).ir
+        proximity = irDistances(distances)
 
         center = proximity[3]
         left = proximity[1]
@@ -66,14 +84,14 @@ async def followObject(robot):
         if center > 15:
             await robot.set_wheel_speeds(5,5)
             await robot.set_lights_rgb(255,255,255)
-            await robot.play_note(Note.D7, 0.3)
+            feedback.play_note(Note.D7, 0.3)
             
         elif center >= 5 and center <= 15:
             difference = left - right
             if abs(difference) <= 25:
                 await robot.set_wheel_speeds(0,0)
                 await robot.set_lights_rgb(0,0,255)
-                await robot.play_note(Note.D6, 0.3)
+                feedback.play_note(Note.D6, 0.3)
             elif difference > 25:
                 await robot.set_wheel_speeds(3,-3)
             elif difference < -25:
@@ -82,9 +100,12 @@ async def followObject(robot):
         else:
             await robot.set_wheel_speeds(-5,-5)
             await robot.set_lights_rgb(255,255,0)
-            await robot.play_note(Note.D5, 0.3)
+            feedback.play_note(Note.D5, 0.3)
+
+        await control.tick()
 
-        await robot.wait(0.1)
+    hub.stop()
+    print("Control loop: " + control.summary())
     
 
 # start the robot
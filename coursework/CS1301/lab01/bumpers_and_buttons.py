@@ -29,12 +29,14 @@ we'll need to interact and change these variables across multiple functions in t
 we must make SPEED and ROTATION_DIR GLOBAL variables.
 """
 
-# importing the Bluetooth class from the irobot_edu_sdk.backend module
-from irobot_edu_sdk.backend.bluetooth import Bluetooth
 # importing various classes and decorators from the irobot_edu_sdk.robots module
 from irobot_edu_sdk.robots import event, hand_over, Color, Robot, Root, Create3
 # importing the Note class from the irobot_edu_sdk.music module
 from irobot_edu_sdk.music import Note
+# makeRobot connects to the robot over Bluetooth (see common/robotBackend.py)
+import os, sys
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "common"))
+from robotBackend import makeRobot  # real robot, or the simulator when CS1301_SIM_ARENA is set
 
 print("Successfully Installed")
 
@@ -44,7 +46,7 @@ print("Successfully Installed")
 
 # TODO: Replace the name of the robot in the parenthesis with
 # the robot you are currently workoTing on
-robot = Create3(Bluetooth("PAIGE-BOT"))
+robot = makeRobot("PAIGE-BOT")
 
 @event(robot.when_play)
 async def play(robot):
@@ -1,11 +1,41 @@
-from irobot_edu_sdk.backend.bluetooth import Bluetooth
 from irobot_edu_sdk.robots import event, hand_over, Color, Robot, Root, Create3
 from irobot_edu_sdk.music import Note
 
 import math as m
+import os, sys
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "common"))
+from robotBackend import makeRobot  # real robot, or the simulator when CS1301_SIM_ARENA is set
+from sensorHub import SensorHub
+from irProcessing import irDistance, closestWall
+from controlLoop import PeriodicLoop
+from commandCoalescer import CoalescingRobot
+from telemetry import TelemetryRecorder, RecordingRobot
+from poseEstimator import PoseEstimator
+from occupancyGrid import OccupancyGrid
 
 # robot is the instance of the robot that will allow us to call its methods and to define events with the @event decorator.
-robot = Create3(Bluetooth("DANNY-BOT"))  # Will connect to the first robot found.
+# Every pose, IR reading and wheel speed sent is recorded to TELEMETRY_FILE in the background,
+# and the positions are appended to PositionData.csv for PointGraph with every block written.
+TELEMETRY_FILE = "DeliveryTelemetry.tlm"
+telemetry = TelemetryRecorder(TELEMETRY_FILE, csv_path="PositionData.csv")
+
+# Wrapped so the 15,15 re-sent on every followObstacle tick only goes out when the speed changes,
+# and so the pose is known for every IR reading without asking for it every time.
+robot = CoalescingRobot(PoseEstimator(RecordingRobot(makeRobot("DANNY-BOT"), telemetry)))  # Will connect to the first robot found.
+
+# Everything the IR sensors see on the way goes into an occupancy grid, saved to MAP_FILE at
+# the end for planning around known obstacles (needs numpy, without it nothing is mapped).
+MAP_FILE = "DeliveryMap.npz"
+try:
+    grid = OccupancyGrid(size=200, resolution=2.0)
+except ImportError:
+    grid = None
+
+# IR readings shared by moveTowardGoal and followObstacle, read at most 10 times a second
+hub = SensorHub(robot, rate=10, pose=False)
+
+# Paces the three loops below at 10 ticks a second (one loop runs at a time)
+control = PeriodicLoop(rate=10)
 
 HAS_COLLIDED = False
 HAS_REALIGNED = False
@@ -18,6 +48,7 @@ IR_ANGLES = [-65.3, -38.0, -20.0, -3.0, 14.25, 34.0, 65.3]
 HEADING = 90
 
 STOP = False
+MAPPED_SEQ = None
 
 # Implementation for fail-safe robots
 # EITHER BUTTON
@@ -46,26 +77,18 @@ def getMinProxApproachAngle(readings):
     if STOP:
         return (0,0)
     
-    IR_ANGLES = [-65.3, -38.0, -20.0, -3.0, 14.25, 34.0, 65.3]
-
-    proximities = []
-    for r in readings:
-        proximity  = 4095/(r + 1)
-        proximities.append(proximity)
-
-    max_index = 0
-    max_value = proximities[0]
-
-    for i, value in enumerate(proximities):
-        if value < max_value:
-            max_value = value
-            max_index = i
-
-    closestDistance = round(max_value, 3)
-    closestAngle = IR_ANGLES[max_index]
+    (closestDistance, closestAngle) = closestWall(readings)
 
     return(closestDistance, closestAngle)
 
+async def mapSample(robot, sample):
+    # Adds a hub sample's IR readings to the map, at the pose the robot is at
+    global MAPPED_SEQ
+    if grid is None or sample.seq == MAPPED_SEQ:
+        return  # mapped already, hub.latest() hands a sample out until the next one
+    MAPPED_SEQ = sample.seq
+    grid.add_scan(await robot.pose(), sample.ir)
+
 def getCorrectionAngle(heading):
     global STOP
     if STOP:
@@ -133,9 +156,13 @@ async def moveTowardGoal(robot):
         return
 
     await robot.set_wheel_speeds(15,15)
+    hub.invalidate()  # we may have just turned
+    control.reset()
 
     while not STOP:
-        readings = (await robot.get_ir_proximity()).sensors
+        sample = await hub.latest()
+        readings = sample.ir
+        await mapSample(robot, sample)
 
         closestDistance, closestAngle = getMinProxApproachAngle(readings)
 
@@ -157,7 +184,7 @@ async def moveTowardGoal(robot):
             HAS_REALIGNED = False
             break
 
-        await robot.wait(0.1)
+        await control.tick()
 
 # === FOLLOW OBSTACLE
 async def followObstacle(robot):
@@ -166,10 +193,14 @@ async def followObstacle(robot):
         return
     
     await robot.set_wheel_speeds(15,15)
+    hub.invalidate()  # we just turned to follow the obstacle
+    control.reset()
 
     while not STOP:
-        readings = (await robot.get_ir_proximity()).sensors
-        proximity = 4095 / (readings[SENSOR2CHECK] + 1)
+        sample = await hub.latest()
+        readings = sample.ir
+        await mapSample(robot, sample)
+        proximity = irDistance(readings[SENSOR2CHECK])
 
         closestDistance, closestAngle = getMinProxApproachAngle(readings)
         if proximity < 20:
@@ -179,6 +210,8 @@ async def followObstacle(robot):
                 await robot.turn_right(-3)
             else:
                 await robot.turn_right(3)
+            hub.invalidate()
+            control.reset()
             await robot.set_wheel_speeds(15,15)
 
         elif proximity > 100:
@@ -191,12 +224,11 @@ async def followObstacle(robot):
         else:
             await robot.set_wheel_speeds(15,15)
 
-        await robot.wait(0.1)      
+        await control.tick()
 
 # ==========================================================
 
 # Main function
-import csv
 @event(robot.when_play)
 async def makeDelivery(robot):
     global STOP, HAS_COLLIDED, HAS_REALIGNED, HAS_FOUND_OBSTACLE, SENSOR2CHECK, HAS_ARRIVED, DESTINATION, ARRIVAL_THRESHOLD
@@ -209,10 +241,6 @@ async def makeDelivery(robot):
         currentX = pose.x
         currentY = pose.y
 
-        with open("PositionData.csv", "a") as f:
-            write = csv.writer(f)
-            write.writerow([pose.x, pose.y])
-        
         heading = pose.heading
         print(f"Heading: {heading}")
         print(f"X: {currentX}")
@@ -238,9 +266,16 @@ async def makeDelivery(robot):
             HAS_FOUND_OBSTACLE = False
             HAS_REALIGNED = False
 
-        await robot.wait(0.1)
+        control.reset()  # moveTowardGoal and followObstacle ran their own loops
+        await control.tick()
 
+    hub.stop()
     await robot.set_wheel_speeds(0,0)
+    print("Control loop: " + control.summary())
+    telemetry.close()
+    if grid is not None:
+        grid.save(MAP_FILE)
+        print("Map: {} scans, {} occupied cells".format(grid.scans, len(grid.occupied_points())))
     return
 
 # start the robot
@@ -1,14 +1,56 @@
+import sys
+from itertools import islice
+
+import numpy as np
 import matplotlib.pyplot as plt
 
-def plot_points(csv_file):
-    xs, ys = [], []
+CHUNK_ROWS = 100000       # lines parsed per numpy call when loading a file
+PLOT_PIXELS = (800, 800)  # roughly the plot's size on screen, used for downsampling
+
+def load_points(csv_file, chunk_rows=CHUNK_ROWS):
+    # Reads the x,y columns into two numpy arrays, chunk_rows lines at a time
+    chunks = []
+    with open(csv_file) as f:
+        f.readline()  # skip header: "x,y" -- If no header, will just skip one line of position data
+        while True:
+            lines = list(islice(f, chunk_rows))
+            if not lines:
+                break
+            chunks.append(parse_lines(lines))
+    if not chunks:
+        return np.empty(0), np.empty(0)
+    points = np.concatenate(chunks)
+    return points[:, 0], points[:, 1]
+
+def parse_lines(lines):
+    # "x,y" lines -> (n, 2) array; blank lines are skipped
+    return np.loadtxt(lines, delimiter=",", usecols=(0, 1), ndmin=2).reshape(-1, 2)
+
+def downsample(xs, ys, pixels=PLOT_PIXELS, bounds=None):
+    # Keeps the first point that lands in each screen pixel, in their original order.
+    # The scatter looks the same (every pixel that would be drawn still is) but a trace
+    # that sat in one spot for an hour becomes a single point.
+    if len(xs) == 0:
+        return xs, ys
+    x_min, x_max, y_min, y_max = bounds if bounds is not None else (xs.min(), xs.max(), ys.min(), ys.max())
+    width, height = pixels
+    cols = ((xs - x_min) * ((width - 1) / max(x_max - x_min, 1e-9))).astype(np.int64)
+    rows = ((ys - y_min) * ((height - 1) / max(y_max - y_min, 1e-9))).astype(np.int64)
+    _, first = np.unique(rows * width + cols, return_index=True)
+    first.sort()
+    return xs[first], ys[first]
+
+def plot_points(csv_file, pixels=PLOT_PIXELS):
     try:
-        with open(csv_file) as f:
-            f.readline()  # skip header: "x,y" -- If no header, will just skip one line of position data
-            for line in f:
-                x_str, y_str = line.strip().split(",")
-                xs.append(float(x_str))
-                ys.append(float(y_str)) # make two parallel lists of each x and y value
+        xs, ys = load_points(csv_file)
+        if len(xs) == 0:
+            print("\"{}\" has no position data yet!".format(csv_file))
+            return
+        # the +-20 buffer below is 40 units wide on both axes, add it before binning
+        bounds = (xs.min() - 20, xs.max() + 20, ys.min() - 20, ys.max() + 20)
+        total = len(xs)
+        xs, ys = downsample(xs, ys, pixels, bounds)
+        print("Plotting {} of {} points".format(len(xs), total))
 
         plt.scatter(xs, ys, c='blue', marker='o') # plot our points
 
@@ -17,8 +59,8 @@ def plot_points(csv_file):
 
         plt.gca().set_aspect('equal', adjustable='box') # keep axis ration the same so we don't stretch points
 
-        plt.xlim(min(xs) - 20, max(xs) + 20) # add some buffer room so our graph has space
-        plt.ylim(min(ys) - 20, max(ys) + 20)
+        plt.xlim(bounds[0], bounds[1]) # add some buffer room so our graph has space
+        plt.ylim(bounds[2], bounds[3])
 
         plt.xlabel("X Direction") # add labels
         plt.ylabel("Y Direction")
@@ -27,5 +69,75 @@ def plot_points(csv_file):
     except FileNotFoundError:
         print("I couldn't find the file \"PositionData.csv\"! (Make sure that it is named correctly and in the same folder)")
 
-# Run
-plot_points("PositionData.csv")
\ No newline at end of file
+def tail_points(csv_file, interval=0.5, pixels=PLOT_PIXELS):
+    # Live plot of a file that is still being written: every `interval` seconds the lines
+    # added since the last check are parsed and only those points are drawn. The whole
+    # plot is redrawn only when new points fall outside the current axis limits.
+    plt.ion()
+    fig, ax = plt.subplots()
+    ax.axhline(0, color='black', linewidth=0.8)
+    ax.axvline(0, color='black', linewidth=0.8)
+    ax.set_aspect('equal', adjustable='box')
+    ax.set_xlabel("X Direction")
+    ax.set_ylabel("Y Direction")
+    ax.set_title("Where does the robot go? (live)")
+    ax.set_xlim(-20, 20)
+    ax.set_ylim(-20, 20)
+    fig.canvas.draw()
+    background = fig.canvas.copy_from_bbox(ax.bbox) if fig.canvas.supports_blit else None
+
+    offset = 0          # bytes of the file already plotted
+    header = True       # the first line is still to be skipped
+    count = 0
+    while plt.fignum_exists(fig.number):
+        try:
+            with open(csv_file, "rb") as f:
+                f.seek(0, 2)
+                if f.tell() < offset:  # file was replaced, start over
+                    for artist in ax.collections[:]:
+                        artist.remove()
+                    offset, header, count = 0, True, 0
+                f.seek(offset)
+                data = f.read()
+        except FileNotFoundError:
+            data = b""
+
+        # only complete lines; a half-written last line waits for the next check
+        end = data.rfind(b"\n") + 1
+        lines = data[:end].decode().splitlines()
+        offset += end
+        if header and lines:
+            lines, header = lines[1:], False
+
+        if lines:
+            points = parse_lines(lines)
+            count += len(points)
+            xs, ys = points[:, 0], points[:, 1]
+            x_min, x_max = ax.get_xlim()
+            y_min, y_max = ax.get_ylim()
+            grow = xs.min() < x_min or xs.max() > x_max or ys.min() < y_min or ys.max() > y_max
+            if grow:
+                # grow the limits to fit, with the same 20 unit buffer as plot_points
+                ax.set_xlim(min(x_min, xs.min() - 20), max(x_max, xs.max() + 20))
+                ax.set_ylim(min(y_min, ys.min() - 20), max(y_max, ys.max() + 20))
+            xs, ys = downsample(xs, ys, pixels, ax.get_xlim() + ax.get_ylim())
+            new = ax.scatter(xs, ys, c='blue', marker='o')
+            if grow or background is None:
+                fig.canvas.draw()
+                if background is not None:
+                    background = fig.canvas.copy_from_bbox(ax.bbox)
+            else:
+                fig.canvas.restore_region(background)
+                ax.draw_artist(new)
+                fig.canvas.blit(ax.bbox)
+                background = fig.canvas.copy_from_bbox(ax.bbox)
+            print("{} points".format(count))
+
+        # not plt.pause(), which would redraw the whole figure every time
+        fig.canvas.start_event_loop(interval)
+
+# Run (python PointGraph.py --follow to watch the file while the robot is driving)
+if "--follow" in sys.argv:
+    tail_points("PositionData.csv")
+else:
+    plot_points("PositionData.csv")
@@ -1,8 +1,19 @@
-from irobot_edu_sdk.backend.bluetooth import Bluetooth
 from irobot_edu_sdk.robots import event, hand_over, Color, Robot, Root, Create3
 from irobot_edu_sdk.music import Note
+import os, sys
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "common"))
+from robotBackend import makeRobot  # real robot, or the simulator when CS1301_SIM_ARENA is set
+from sensorHub import SensorHub
+from irProcessing import closestWall
+from controlLoop import PeriodicLoop
 
-robot = Create3(Bluetooth("BAYMAX"))   # Put robot name here.
+robot = makeRobot("BAYMAX")   # Put robot name here.
+
+# IR readings from a background reader, at most 20 times a second
+hub = SensorHub(robot, rate=20, pose=False)
+
+# the pong loop runs 20 times a second
+control = PeriodicLoop(rate=20)
 
 # IR Sensor Angles
 IR_ANGLES = [-65.3, -38.0, -20.0, -3.0, 14.25, 34.0, 65.3]
@@ -63,7 +74,7 @@ async def robotPong(robot):
 
     while not STOP:
         
-        ir_readings = (await robot.get_ir_proximity()).sensors
+        ir_readings = (await hub.latest()).ir
         (approx_dist, approx_angle) = angleOfClosestWall(ir_readings)
         (direction, turningAngle) = calculateReflectionAngle(approx_angle)
 
@@ -80,11 +91,17 @@ async def robotPong(robot):
                 await robot.turn_right(turningAngle)
             else:
                 await robot.turn_left(turningAngle)
+            hub.invalidate()  # don't react to readings taken before the turn
 
             await robot.wait(0.5)
             await robot.set_wheel_speeds(15,15)
+            control.reset()  # the bounce took as long as it took
 
+        await control.tick()
+
+    hub.stop()
     await robot.set_wheel_speeds(0,0)
+    print("Control loop: " + control.summary())
 
 def angleOfClosestWall(readings):
     """Remember that this function can be autograded!"""
@@ -93,23 +110,8 @@ def angleOfClosestWall(readings):
     # Arguments -> readings(list): 7 IR sensor readings
     # Returns   -> tuple: (closestDistance, closestAngle)
     
-    IR_ANGLES = [-65.3, -38.0, -20.0, -3.0, 14.25, 34.0, 65.3]
-
-    proximities = []
-    for r in readings:
-        proximity  = 4095/(r + 1)
-        proximities.append(proximity)
-
-    min_index = 0
-    min_value = proximities[0]
-
-    for i, value in enumerate(proximities):
-        if value < min_value:
-            min_value = value
-            min_index = i
-
-    closestDistance = round(min_value, 3)
-    closestAngle = IR_ANGLES[min_index]
+    # the highest reading is the closest wall (first sensor on ties); see common/irProcessing.py
+    (closestDistance, closestAngle) = closestWall(readings)
 
     return(closestDistance, closestAngle)
 
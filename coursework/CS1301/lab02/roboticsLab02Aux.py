@@ -1,5 +1,10 @@
 import math as m
 
+try:
+    import numpy as np  # only needed by the batch functions at the bottom
+except ImportError:
+    np = None
+
 STOP = False
 
 def angleOfClosestWall(readings):
@@ -66,6 +71,44 @@ def getMinProxApproachAngle(readings):
 
     return(closestDistance, closestAngle)
 
+# ==== Batch versions, for replaying recorded readings offline ====
+# Each takes an (N, 7) array of readings (or N angles) and returns arrays of N results,
+# matching the single-reading functions above element by element.
+
+BATCH_IR_ANGLES = (-65.3, -38.0, -20.0, -3.0, 14.25, 34.0, 65.3)
+
+def closestWallBatch(readings):
+    # -> (closestDistances, closestAngles): the highest reading of each row (first
+    # sensor on ties) as a distance rounded to 3 places, and that sensor's angle
+    readings = np.asarray(readings)
+    index = np.argmax(readings, axis=1)
+    closest = np.take_along_axis(readings, index[:, None], axis=1)[:, 0]
+    return (np.round(4095 / (closest + 1), 3), np.array(BATCH_IR_ANGLES)[index])
+
+def angleOfClosestWallBatch(readings):
+    # -> (closestDistances, closestAngles)
+    return closestWallBatch(readings)
+
+def calculateReflectionAngleBatch(angles):
+    # -> (directions, turningAngles); directions holds "right"/"left" strings
+    angles = np.asarray(angles, dtype=float)
+    directions = np.where(angles < 0, "right", "left")
+    turningAngles = np.round(180 - 2 * np.abs(angles), 3)
+    return (directions, turningAngles)
+
+def getMinProxApproachAngleBatch(readings):
+    # -> (closestDistances, closestAngles); STOP is ignored, there is no robot to stop
+    return closestWallBatch(readings)
+
+def replayReflections(readings, threshold=20):
+    # What RobotPong would do for every recorded reading: a dict of arrays with the
+    # distance and angle of the closest wall, the turn direction and angle, and
+    # "turns", True where the wall is close enough (<= threshold) to bounce off
+    distances, angles = angleOfClosestWallBatch(readings)
+    directions, turningAngles = calculateReflectionAngleBatch(angles)
+    return {"distance": distances, "angle": angles, "direction": directions,
+            "turningAngle": turningAngles, "turns": distances <= threshold}
+
 def getCorrectionAngle(heading):
     global STOP
     if STOP:
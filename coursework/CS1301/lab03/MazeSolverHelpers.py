@@ -1,8 +1,68 @@
-from collections import deque
-import math
+from array import array
+from collections import OrderedDict, deque
+from collections.abc import Mapping
+import heapq
+import struct
+
+try:
+    import numpy as np
+except ImportError:  # only the "numpy" planner needs it
+    np = None
+
+# Wall bits for GridMaze's per-cell wall masks
+WALL_N = 1
+WALL_E = 2
+WALL_S = 4
+WALL_W = 8
+ALL_WALLS = WALL_N | WALL_E | WALL_S | WALL_W
+
+# Wall bit crossed when moving by (dx, dy)
+WALL_BETWEEN = {(0, 1): WALL_N, (1, 0): WALL_E, (0, -1): WALL_S, (-1, 0): WALL_W}
+OPPOSITE_WALL = {WALL_N: WALL_S, WALL_E: WALL_W, WALL_S: WALL_N, WALL_W: WALL_E}
+
+# Integer compass directions, clockwise so (target - current) % 4 is the turn to make.
+# The string helpers below ("N", "E", "S", "W") are kept for the autograder.
+DIR_N, DIR_E, DIR_S, DIR_W = range(4)
+DIRECTION_NAMES = "NESW"
+DIRECTION_INDEX = {"N": DIR_N, "E": DIR_E, "S": DIR_S, "W": DIR_W}
+DIRECTION_OFFSETS = ((0, 1), (1, 0), (0, -1), (-1, 0))
+
+# Compass direction of a one-cell step (dx, dy)
+STEP_DIRECTION = {offset: d for d, offset in enumerate(DIRECTION_OFFSETS)}
+
+# Flattened (left, front, right, back) offsets when facing each direction
+RELATIVE_OFFSETS = tuple(tuple(c for turn in (3, 0, 1, 2) for c in DIRECTION_OFFSETS[(d + turn) % 4])
+                         for d in range(4))
+
+# Degrees to turn right (negative turns left), indexed by (target - current) % 4
+TURN_DEGREES = (0, 90, 180, -90)
+
+# Closest cardinal direction for each whole degree of heading (360 covers float rounding)
+ORIENTATION_BY_DEGREE = tuple(
+    DIR_N if 45 <= h < 135 else DIR_W if 135 <= h < 225 else DIR_S if 225 <= h < 315 else DIR_E
+    for h in range(361))
+
+# GridMaze's stand-in for an infinite cost
+UNREACHED = 2**31 - 1
+
+# GridMaze keeps the order of each cell's neighbors (which decides get_next_cell's ties)
+# in one byte: four 2-bit directions, first in the low bits. Open sides are listed in
+# that order. DEFAULT_ORDER is W, S, N, E, the sorted order Maze.add_all_neighbors makes.
+SIDE_WALLS = (WALL_N, WALL_E, WALL_S, WALL_W)   # indexed by direction
+ORDER_SIDES = tuple(tuple((b >> (2 * k)) & 3 for k in range(4)) for b in range(256))
+DEFAULT_ORDER = 3 | 2 << 2 | 0 << 4 | 1 << 6
+
+# Saved map files: magic, format version, nX, nY, then the wall masks packed two
+# cells per byte (low nibble first) and the visited flags packed eight per byte,
+# both in x * nY + y order
+MAP_MAGIC = b"MAZE"
+MAP_VERSION = 1
+MAP_HEADER = struct.Struct("<4sBHH")
 
 class Cell:
     # Represents a single cell in the maze's grid
+    __slots__ = ("coords", "neighbors", "visited", "cost", "flooded")
+
     def __init__(self, x, y):
         # Initializes a cell with its coordinates and default attributes
         self.coords = (x,y)
@@ -13,8 +73,12 @@ class Cell:
 
 class Maze:
     # Manages the grid of Cells and handles maze-wide algorithms
-    def __init__(self, nXCells, nYCells):
+    PLANNERS = ("full", "incremental", "numpy")
+
+    def __init__(self, nXCells, nYCells, planner="full", cache_size=0):
         # Initializes the maze grid with Cell objects
+        self.nX = nXCells
+        self.nY = nYCells
         self.grid = {}
 
         #create all cells in the grid
@@ -22,6 +86,33 @@ class Maze:
             for y in range(nYCells):
                 self.grid[(x,y)] = Cell(x,y)
 
+        self._init_planner(planner, cache_size)
+
+    def _init_planner(self, planner, cache_size=0):
+        # planner="full" re-floods the whole grid on every update_costs call (reference)
+        # planner="incremental" only re-propagates the cells a wall change affects
+        # planner="numpy" re-floods the whole grid with one array step per BFS layer
+        if planner not in self.PLANNERS:
+            raise ValueError(f"unknown planner {planner!r}, expected one of {self.PLANNERS}")
+        if planner == "numpy" and np is None:
+            raise ImportError("the numpy planner needs numpy installed")
+        self.planner = planner
+
+        # incremental planner state (LPA* with unit edge costs and no heuristic)
+        self._plan_goal = None   # goal the current costs were computed for
+        self._rhs = {}           # one-step lookahead cost of every cell
+        self._queue = []         # heap of (key, order, coords) for inconsistent cells
+        self._queued = {}        # coords -> order of its live heap entry
+        self._order = 0
+        self._changed = set()    # cells whose neighbor lists changed since the last plan
+
+        # distance-field cache: up to cache_size goals other than the current one keep
+        # their costs, tagged with the wall version they were computed on (0 disables it)
+        self.version = 0         # bumped every time a wall actually changes
+        self.cache_size = cache_size
+        self._fields = OrderedDict()   # goal -> (version, exported costs), oldest first
+        self._costs_key = None   # (goal, version) the cell costs currently hold
+
     def get_cell(self, coords):
         # Safely retrieves a cell object from the grid
         return self.grid.get(coords, None)
@@ -48,29 +139,137 @@ class Maze:
                     neighbors.sort()
                     cell.neighbors = neighbors
 
+        # every neighbor list was replaced, so the next plan has to start over
+        self._plan_goal = None
+        self.version += 1
+
 
     def update_neighbors(self, current_coords, navigable_neighbors):
-        # Updates the neighbors for a cell based on wall detection
+        # Updates the neighbors for a cell based on wall detection.
+        # Links are kept symmetric, so the only cells that can list current_coords are its
+        # old neighbors, the navigable ones and its four geometric neighbors. Just those
+        # are touched, which makes this O(degree) instead of a scan of the whole grid.
         current_cell = self.get_cell(current_coords)
         if not current_cell:
             return
 
-        # set current neighbors to the navigable list
+        x, y = current_coords
+        affected = set(current_cell.neighbors)
+        affected.update(navigable_neighbors)
+        affected.update(((x, y + 1), (x + 1, y), (x, y - 1), (x - 1, y)))
+        affected.discard(current_coords)
+
+        # set current neighbors to the navigable list (a reordering is not a wall change)
+        changed = set(current_cell.neighbors) != set(navigable_neighbors)
+        if changed:
+            self._changed.add(current_coords)
         current_cell.neighbors = navigable_neighbors[:]
 
-        for coords, cell in self.grid.items():
-            if coords == current_coords:
+        for coords in affected:
+            cell = self.grid.get(coords)
+            if not cell:
                 continue
-            
+
             if current_coords in cell.neighbors and coords not in navigable_neighbors:
                 cell.neighbors.remove(current_coords)
-            
+                self._changed.add(coords)
+                changed = True
+
             # If this cell should list current_coords but doesn't
             if coords in navigable_neighbors and current_coords not in cell.neighbors:
                 cell.neighbors.append(current_coords)
+                self._changed.add(coords)
+                changed = True
+
+        if changed:
+            self.version += 1
+
+    def set_wall(self, a_coords, b_coords, closed):
+        # Closes (or opens) the link between two adjacent cells on both sides at once.
+        # Idempotent and O(1); returns True only if the maze actually changed.
+        a_cell = self.get_cell(a_coords)
+        b_cell = self.get_cell(b_coords)
+        adjacent = (b_coords[0] - a_coords[0], b_coords[1] - a_coords[1]) in WALL_BETWEEN
+        if not a_cell or not b_cell or not adjacent:
+            return False
+
+        changed = False
+        for cell, other in ((a_cell, b_coords), (b_cell, a_coords)):
+            if closed and other in cell.neighbors:
+                cell.neighbors.remove(other)
+                changed = True
+            elif not closed and other not in cell.neighbors:
+                cell.neighbors.append(other)
+                changed = True
+        if changed:
+            self._changed.add(a_coords)
+            self._changed.add(b_coords)
+            self.version += 1
+        return changed
 
     def update_costs(self, goal_coords):
+        # Updates the cost for every cell using the maze's planner.
+        # With cache_size > 0, a goal whose walls haven't changed since it was last planned
+        # is restored from the cache (or left alone if it is the current one).
+        if self.cache_size:
+            if self._costs_key == (goal_coords, self.version):
+                return
+            self._stash_field()
+            if self._restore_field(goal_coords):
+                return
+
+        if self.planner == "incremental":
+            self._update_costs_incremental(goal_coords)
+        elif self.planner == "numpy":
+            self._update_costs_numpy(goal_coords)
+        else:
+            self._update_costs_full(goal_coords)
+        self._costs_key = (goal_coords, self.version)
+
+    def _stash_field(self):
+        # Saves the current costs in the cache if they still match the walls
+        if self._costs_key is None or self._costs_key[1] != self.version:
+            return
+        goal_coords = self._costs_key[0]
+        self._fields[goal_coords] = (self.version, self.export_costs())
+        self._fields.move_to_end(goal_coords)
+        while len(self._fields) > self.cache_size:
+            self._fields.popitem(last=False)
+
+    def _restore_field(self, goal_coords):
+        # Loads a cached field for goal_coords; returns False on a miss or a stale entry
+        entry = self._fields.pop(goal_coords, None)
+        if entry is None or entry[0] != self.version:
+            return False
+        self.import_costs(entry[1])
+        self._costs_key = (goal_coords, self.version)
+        self._changed.clear()
+
+        if self.planner == "incremental":
+            # a cached field is fully consistent, so it can seed later repairs directly
+            self._plan_goal = goal_coords
+            self._seed_rhs()
+        return True
+
+    def _seed_rhs(self):
+        # Starts the incremental planner's state from the current, consistent costs
+        self._queue = []
+        self._queued = {}
+        self._rhs = {coords: cell.cost for coords, cell in self.grid.items()}
+
+    def export_costs(self):
+        # Copy of every cell's cost, in grid order
+        return [cell.cost for cell in self.grid.values()]
+
+    def import_costs(self, costs):
+        # Overwrites every cell's cost with a list from export_costs
+        for cell, cost in zip(self.grid.values(), costs):
+            cell.cost = cost
+            cell.flooded = cost != float('inf')
+
+    def _update_costs_full(self, goal_coords):
         # Runs the flood-fill algorithm to update the cost for every cell
+        self._changed.clear()
         for cell in self.grid.values():
             cell.flooded = False
             cell.cost = float('inf')
@@ -91,6 +290,148 @@ class Maze:
                     neighbor_cell.cost = current.cost + 1
                     queue.append(neighbor_cell)
 
+    def _update_costs_numpy(self, goal_coords):
+        # Runs the vectorized flood fill over the wall masks and copies the costs back.
+        # Only links between geometric neighbors are followed.
+        self._changed.clear()
+        costs = floodFillWalls(self.wall_masks(), self.nY, goal_coords)
+        for (x, y), cell in self.grid.items():
+            cost = int(costs[x * self.nY + y])
+            cell.flooded = cost != UNREACHED
+            cell.cost = cost if cell.flooded else float('inf')
+
+    def _update_costs_incremental(self, goal_coords):
+        # Repairs the costs from the last plan instead of re-flooding the grid.
+        # Only cells touched by update_neighbors since the last call are re-evaluated,
+        # and the repair spreads no further than the cells whose cost actually changes.
+        # Relies on neighbor lists being symmetric, which update_neighbors maintains.
+        if goal_coords != self._plan_goal:
+            # a new goal invalidates every cost, so seed the search from scratch
+            self._plan_goal = goal_coords
+            self._queue = []
+            self._queued = {}
+            for coords, cell in self.grid.items():
+                cell.cost = float('inf')
+                cell.flooded = False
+                self._rhs[coords] = float('inf')
+            if goal_coords in self.grid:
+                self._rhs[goal_coords] = 0
+                self._push(goal_coords, 0)
+        else:
+            for coords in self._changed:
+                self._update_vertex(coords)
+        self._changed.clear()
+
+        while self._queue:
+            key, order, coords = heapq.heappop(self._queue)
+            if self._queued.get(coords) != order:
+                continue  # stale entry, the cell was re-queued or settled since
+            del self._queued[coords]
+
+            cell = self.grid[coords]
+            if cell.cost > self._rhs[coords]:
+                # cost went down: settle it and let the neighbors pick it up
+                cell.cost = self._rhs[coords]
+                cell.flooded = True
+                for neighbor_coords in cell.neighbors:
+                    self._update_vertex(neighbor_coords)
+            else:
+                # cost went up: forget it and re-derive it and its neighbors
+                cell.cost = float('inf')
+                cell.flooded = False
+                self._update_vertex(coords)
+                for neighbor_coords in cell.neighbors:
+                    self._update_vertex(neighbor_coords)
+
+    def _update_vertex(self, coords):
+        # Recomputes a cell's lookahead cost and (re)queues it if it is inconsistent
+        cell = self.grid.get(coords)
+        if cell is None:
+            return
+        if coords != self._plan_goal:
+            best = float('inf')
+            for neighbor_coords in cell.neighbors:
+                neighbor_cell = self.grid.get(neighbor_coords)
+                if neighbor_cell and neighbor_cell.cost + 1 < best:
+                    best = neighbor_cell.cost + 1
+            self._rhs[coords] = best
+
+        if cell.cost != self._rhs[coords]:
+            self._push(coords, min(cell.cost, self._rhs[coords]))
+        else:
+            self._queued.pop(coords, None)
+
+    def _push(self, coords, key):
+        # Queues a cell, superseding any entry it already has in the heap
+        self._order += 1
+        self._queued[coords] = self._order
+        heapq.heappush(self._queue, (key, self._order, coords))
+
+    def wall_masks(self):
+        # Encodes the neighbor lists as one WALL_* bitmask per cell, indexed by x * nY + y
+        masks = bytearray([ALL_WALLS]) * (self.nX * self.nY)
+        for (x, y), cell in self.grid.items():
+            walls = ALL_WALLS
+            for nx, ny in cell.neighbors:
+                walls &= ~WALL_BETWEEN.get((nx - x, ny - y), 0)
+            masks[x * self.nY + y] = walls
+        return masks
+
+    def set_wall_masks(self, masks):
+        # Replaces every link with the open sides of WALL_* masks indexed by x * nY + y
+        for cell in self.grid.values():
+            cell.neighbors = []
+        for (x, y) in self.grid:
+            walls = masks[x * self.nY + y]
+            for step, side in WALL_BETWEEN.items():
+                if not walls & side:
+                    self.set_wall((x, y), (x + step[0], y + step[1]), False)
+        self._plan_goal = None
+        self.version += 1
+
+    def save(self, path):
+        # Writes the walls, visited flags and dimensions to a compact binary map file
+        n = self.nX * self.nY
+        masks = self.wall_masks()
+        walls = bytearray((n + 1) // 2)
+        visited = bytearray((n + 7) // 8)
+        for i in range(n):
+            walls[i >> 1] |= masks[i] << (4 * (i & 1))
+        for (x, y), cell in self.grid.items():
+            if cell.visited:
+                i = x * self.nY + y
+                visited[i >> 3] |= 1 << (i & 7)
+        with open(path, "wb") as f:
+            f.write(MAP_HEADER.pack(MAP_MAGIC, MAP_VERSION, self.nX, self.nY))
+            f.write(walls)
+            f.write(visited)
+
+    @classmethod
+    def load(cls, path, planner="full", cache_size=0):
+        # Builds a maze from a file written by save()
+        with open(path, "rb") as f:
+            data = f.read()
+        if len(data) < MAP_HEADER.size:
+            raise ValueError(f"{path} is too short to be a maze map")
+        magic, version, nX, nY = MAP_HEADER.unpack_from(data)
+        if magic != MAP_MAGIC or version != MAP_VERSION:
+            raise ValueError(f"{path} is not a version {MAP_VERSION} maze map")
+        n = nX * nY
+        walls_end = MAP_HEADER.size + (n + 1) // 2
+        if len(data) != walls_end + (n + 7) // 8:
+            raise ValueError(f"{path} has the wrong size for a {nX}x{nY} maze map")
+
+        masks = bytearray(n)
+        for i in range(n):
+            masks[i] = (data[MAP_HEADER.size + (i >> 1)] >> (4 * (i & 1))) & ALL_WALLS
+        maze = cls(nX, nY, planner=planner, cache_size=cache_size)
+        maze.set_wall_masks(masks)
+        for (x, y) in maze.grid:
+            i = x * nY + y
+            if data[walls_end + (i >> 3)] >> (i & 7) & 1:
+                maze.get_cell((x, y)).visited = True
+        return maze
+
     def get_next_cell(self, current_coords):
         # Determines the best neighboring cell to move to
         current_cell = self.get_cell(current_coords)
@@ -111,7 +452,425 @@ class Maze:
             best = min(current_cell.neighbors, key=lambda n: self.get_cell(n).cost)
         
         return best
-    
+
+    def shortest_route(self, start_coords, goal_coords):
+        # Follows the costs from the last update_costs(goal_coords) straight down to the
+        # goal, ignoring visited flags. Returns None if start_coords can't reach it.
+        cell = self.get_cell(start_coords)
+        if cell is None or cell.cost == float('inf'):
+            return None
+        route = []
+        coords = start_coords
+        cost = cell.cost
+        while coords != goal_coords:
+            neighbors = self.get_cell(coords).neighbors
+            if not neighbors:
+                return None
+            coords = min(neighbors, key=lambda n: self.get_cell(n).cost)
+            if self.get_cell(coords).cost >= cost:
+                return None  # the costs weren't computed for goal_coords
+            cost = self.get_cell(coords).cost
+            route.append(coords)
+        return route
+
+    def plan_route(self, start_coords, goal_coords):
+        # Chains get_next_cell through cells that were already visited (and sensed), so
+        # it follows the same cost rule as a step-by-step run. Where costs tie, the pick
+        # depends on neighbor order, so the route may differ from one taken cell by cell.
+        # Stops after the first unvisited cell, which still has to be sensed, or at the goal.
+        # Returns the cells to drive through, not including start_coords.
+        route = []
+        seen = {start_coords}
+        coords = start_coords
+        while coords != goal_coords:
+            next_coords = self.get_next_cell(coords)
+            if next_coords is None or next_coords in seen:
+                break  # dead end, or no way down the costs from here
+            route.append(next_coords)
+            seen.add(next_coords)
+            if not self.get_cell(next_coords).visited:
+                break
+            coords = next_coords
+        return route
+
+
+class GridCell:
+    # Lightweight view of one GridMaze cell with the same attributes as Cell
+    __slots__ = ("_maze", "_index", "coords")
+
+    def __init__(self, maze, coords):
+        self._maze = maze
+        self._index = coords[0] * maze.nY + coords[1]
+        self.coords = coords
+
+    @property
+    def neighbors(self):
+        # Open sides in the order a Maze cell would list them
+        x, y = self.coords
+        walls = self._maze.walls[self._index]
+        neighbors = []
+        for d in ORDER_SIDES[self._maze.order[self._index]]:
+            if not walls & SIDE_WALLS[d]:
+                dx, dy = DIRECTION_OFFSETS[d]
+                neighbors.append((x + dx, y + dy))
+        return neighbors
+
+    @neighbors.setter
+    def neighbors(self, neighbors):
+        self._maze.update_neighbors(self.coords, neighbors)
+
+    @property
+    def visited(self):
+        return bool(self._maze.visited[self._index])
+
+    @visited.setter
+    def visited(self, value):
+        self._maze.visited[self._index] = 1 if value else 0
+
+    @property
+    def cost(self):
+        cost = self._maze.costs[self._index]
+        return float('inf') if cost == UNREACHED else cost
+
+    @cost.setter
+    def cost(self, value):
+        self._maze.costs[self._index] = UNREACHED if value == float('inf') else int(value)
+
+    @property
+    def flooded(self):
+        return bool(self._maze.flooded[self._index])
+
+    @flooded.setter
+    def flooded(self, value):
+        self._maze.flooded[self._index] = 1 if value else 0
+
+
+class GridCells(Mapping):
+    # Read-only (x, y) -> GridCell mapping so GridMaze.grid works like Maze.grid
+    def __init__(self, maze):
+        self._maze = maze
+
+    def __getitem__(self, coords):
+        if not self._maze.in_bounds(coords):
+            raise KeyError(coords)
+        return GridCell(self._maze, coords)
+
+    def __contains__(self, coords):
+        return self._maze.in_bounds(coords)
+
+    def __iter__(self):
+        for x in range(self._maze.nX):
+            for y in range(self._maze.nY):
+                yield (x, y)
+
+    def __len__(self):
+        return self._maze.nX * self._maze.nY
+
+
+class GridMaze(Maze):
+    # Maze stored in flat arrays indexed by x * nY + y instead of a dict of Cells.
+    # Each cell takes one wall-mask byte (WALL_N/E/S/W bits), one neighbor-order byte,
+    # one visited byte, one flooded byte and one 32-bit cost: 8 bytes, so a 512x512 map
+    # takes about 2.1 MB with the full or numpy planner. The incremental planner adds a
+    # 32-bit rhs and a 64-bit queue entry per cell, about 5.2 MB at 512x512.
+    # Walls are shared by both cells they separate, which keeps the maze symmetric.
+    # Neighbors are listed in the same order as Maze lists them, so exploration makes
+    # the same choices. get_cell returns a GridCell view, so code written against Maze
+    # keeps working.
+    def __init__(self, nXCells, nYCells, planner="full", cache_size=0):
+        self.nX = nXCells
+        self.nY = nYCells
+        n = nXCells * nYCells
+        self.walls = bytearray([ALL_WALLS]) * n   # no links until neighbors are added
+        self.order = bytearray([DEFAULT_ORDER]) * n
+        self.visited = bytearray(n)
+        self.flooded = bytearray(n)
+        self.costs = array('i', [0]) * n
+        self.grid = GridCells(self)
+        self._init_planner(planner, cache_size)
+
+    def _init_planner(self, planner, cache_size=0):
+        # Same planners, with the incremental state in arrays indexed like costs
+        super()._init_planner(planner, cache_size)
+        self._goal_index = -1
+        if planner == "incremental":
+            n = self.nX * self.nY
+            self._rhs = array('i', [UNREACHED]) * n
+            self._queued = array('q', [0]) * n   # order of the live heap entry, 0 if none
+
+    def in_bounds(self, coords):
+        # Checks whether coords is an (x, y) pair inside the maze
+        try:
+            x, y = coords
+        except (TypeError, ValueError):
+            return False
+        return 0 <= x < self.nX and 0 <= y < self.nY
+
+    def index(self, coords):
+        # Flat array index of a cell
+        return coords[0] * self.nY + coords[1]
+
+    def get_cell(self, coords):
+        # Safely retrieves a view of a cell from the grid
+        if not self.in_bounds(coords):
+            return None
+        return GridCell(self, coords)
+
+    def add_all_neighbors(self, nXCells, nYCells):
+        # Opens every interior wall, leaving only the outer boundary closed
+        nY = self.nY
+        for x in range(self.nX):
+            for y in range(nY):
+                walls = 0
+                if y == nY - 1:
+                    walls |= WALL_N
+                if x == self.nX - 1:
+                    walls |= WALL_E
+                if y == 0:
+                    walls |= WALL_S
+                if x == 0:
+                    walls |= WALL_W
+                self.walls[x * nY + y] = walls
+        self.order = bytearray([DEFAULT_ORDER]) * (self.nX * nY)
+        self._plan_goal = None
+        self.version += 1
+
+    def update_neighbors(self, current_coords, navigable_neighbors):
+        # Opens the sides of the cell that lead to navigable neighbors and closes the rest.
+        # Only the four sides of the current cell are touched, and each wall is stored on
+        # both cells it separates. Non-adjacent entries in navigable_neighbors are ignored.
+        if not self.in_bounds(current_coords):
+            return
+        x, y = current_coords
+        for coords in ((x, y + 1), (x + 1, y), (x, y - 1), (x - 1, y)):
+            self.set_wall(current_coords, coords, coords not in navigable_neighbors)
+
+        # like Maze, the cell lists its neighbors in the order given
+        sides = [STEP_DIRECTION[(nx - x, ny - y)] for nx, ny in navigable_neighbors
+                 if (nx - x, ny - y) in STEP_DIRECTION]
+        sides = list(dict.fromkeys(sides))
+        i = self.index(current_coords)
+        self.order[i] = packOrder(sides + [d for d in ORDER_SIDES[self.order[i]] if d not in sides])
+
+    def set_wall(self, a_coords, b_coords, closed):
+        # Closes (or opens) the wall between two adjacent cells in both of their masks.
+        # Idempotent and O(1); returns True only if the maze actually changed.
+        side = WALL_BETWEEN.get((b_coords[0] - a_coords[0], b_coords[1] - a_coords[1]))
+        if side is None or not self.in_bounds(a_coords) or not self.in_bounds(b_coords):
+            return False
+        i = self.index(a_coords)
+        j = self.index(b_coords)
+        if closed == bool(self.walls[i] & side):
+            return False
+
+        opposite = OPPOSITE_WALL[side]
+        if closed:
+            self.walls[i] |= side
+            self.walls[j] |= opposite
+        else:
+            # an opened side goes to the end of both lists, like Maze's append
+            self.walls[i] &= ~side
+            self.walls[j] &= ~opposite
+            self._move_last(i, SIDE_WALLS.index(side))
+            self._move_last(j, SIDE_WALLS.index(opposite))
+        self._changed.add(a_coords)
+        self._changed.add(b_coords)
+        self.version += 1
+        return True
+
+    def _update_costs_full(self, goal_coords):
+        # Breadth-first flood fill over the wall masks
+        self._changed.clear()
+        n = self.nX * self.nY
+        self.costs = costs = array('i', [UNREACHED]) * n
+        self.flooded = flooded = bytearray(n)
+        if not self.in_bounds(goal_coords):
+            return
+
+        nY = self.nY
+        walls = self.walls
+        goal = self.index(goal_coords)
+        costs[goal] = 0
+        flooded[goal] = 1
+        queue = deque([goal])
+        while queue:
+            i = queue.popleft()
+            cost = costs[i] + 1
+            open_sides = ~walls[i]
+            for side, j in ((WALL_N, i + 1), (WALL_E, i + nY), (WALL_S, i - 1), (WALL_W, i - nY)):
+                if open_sides & side and not flooded[j]:
+                    flooded[j] = 1
+                    costs[j] = cost
+                    queue.append(j)
+
+    def wall_masks(self):
+        # The wall masks are already stored, so hand out a copy
+        return bytearray(self.walls)
+
+    def set_wall_masks(self, masks):
+        # Copies WALL_* masks in as the walls, keeping the outer boundary closed
+        for x in range(self.nX):
+            for y in range(self.nY):
+                i = x * self.nY + y
+                walls = masks[i]
+                if y == self.nY - 1:
+                    walls |= WALL_N
+                if x == self.nX - 1:
+                    walls |= WALL_E
+                if y == 0:
+                    walls |= WALL_S
+                if x == 0:
+                    walls |= WALL_W
+                self.walls[i] = walls
+        # Maze.set_wall_masks opens the links cell by cell, which leaves every cell in
+        # the sorted order too
+        self.order = bytearray([DEFAULT_ORDER]) * (self.nX * self.nY)
+        self._plan_goal = None
+        self.version += 1
+
+    def _move_last(self, i, direction):
+        # Moves a direction to the end of cell i's neighbor order
+        sides = [d for d in ORDER_SIDES[self.order[i]] if d != direction]
+        self.order[i] = packOrder(sides + [direction])
+
+    def _seed_rhs(self):
+        self._queue = []
+        self._queued = array('q', [0]) * (self.nX * self.nY)
+        self._rhs = array('i', self.costs)
+        self._goal_index = self.index(self._plan_goal)
+
+    def _update_costs_incremental(self, goal_coords):
+        # Maze's repair over the flat arrays: rhs and the queued entries are indexed like
+        # costs, and the heap holds flat indices
+        n = self.nX * self.nY
+        if goal_coords != self._plan_goal:
+            self._plan_goal = goal_coords
+            self._queue = []
+            self._queued = array('q', [0]) * n
+            self._rhs = array('i', [UNREACHED]) * n
+            self.costs = array('i', [UNREACHED]) * n
+            self.flooded = bytearray(n)
+            self._goal_index = -1
+            if self.in_bounds(goal_coords):
+                self._goal_index = self.index(goal_coords)
+                self._rhs[self._goal_index] = 0
+                self._push(self._goal_index, 0)
+        else:
+            for coords in self._changed:
+                self._update_vertex(self.index(coords))
+        self._changed.clear()
+
+        nY = self.nY
+        walls, costs, flooded, rhs, queued = self.walls, self.costs, self.flooded, self._rhs, self._queued
+        queue = self._queue
+        while queue:
+            key, order, i = heapq.heappop(queue)
+            if queued[i] != order:
+                continue  # stale entry, the cell was re-queued or settled since
+            queued[i] = 0
+
+            if costs[i] > rhs[i]:
+                # cost went down: settle it and let the neighbors pick it up
+                costs[i] = rhs[i]
+                flooded[i] = 1
+            else:
+                # cost went up: forget it and re-derive it and its neighbors
+                costs[i] = UNREACHED
+                flooded[i] = 0
+                self._update_vertex(i)
+            open_sides = ~walls[i]
+            for side, j in ((WALL_N, i + 1), (WALL_E, i + nY), (WALL_S, i - 1), (WALL_W, i - nY)):
+                if open_sides & side:
+                    self._update_vertex(j)
+
+    def _update_vertex(self, i):
+        # Recomputes the lookahead cost of flat index i and (re)queues it if inconsistent
+        costs = self.costs
+        if i != self._goal_index:
+            best = UNREACHED
+            open_sides = ~self.walls[i]
+            nY = self.nY
+            for side, j in ((WALL_N, i + 1), (WALL_E, i + nY), (WALL_S, i - 1), (WALL_W, i - nY)):
+                if open_sides & side and costs[j] != UNREACHED and costs[j] + 1 < best:
+                    best = costs[j] + 1
+            self._rhs[i] = best
+
+        if costs[i] != self._rhs[i]:
+            self._push(i, min(costs[i], self._rhs[i]))
+        else:
+            self._queued[i] = 0
+
+    def _push(self, i, key):
+        # Queues flat index i, superseding any entry it already has in the heap
+        self._order += 1
+        self._queued[i] = self._order
+        heapq.heappush(self._queue, (key, self._order, i))
+
+    def export_costs(self):
+        # Copy of the cost array (UNREACHED for infinite costs)
+        return array('i', self.costs)
+
+    def import_costs(self, costs):
+        # Replaces the cost array with one from export_costs
+        self.costs = array('i', costs)
+        self.flooded = bytearray(cost != UNREACHED for cost in costs)
+
+    def _update_costs_numpy(self, goal_coords):
+        # Vectorized flood fill straight over the stored wall masks
+        self._changed.clear()
+        costs = floodFillWalls(self.walls, self.nY, goal_coords)
+        self.costs = array('i')
+        self.costs.frombytes(costs.astype(np.int32).tobytes())
+        self.flooded = bytearray((costs != UNREACHED).tobytes())
+
+    def get_next_cell(self, current_coords):
+        # Determines the best neighboring cell to move to
+        if not self.in_bounds(current_coords):
+            return None
+        neighbors = self.get_cell(current_coords).neighbors
+        if not neighbors:
+            return None
+
+        unvisited = [n for n in neighbors if not self.visited[self.index(n)]]
+        candidates = unvisited if unvisited else neighbors
+        return min(candidates, key=lambda n: self.costs[self.index(n)])
+
+
+def packOrder(directions):
+    # Neighbor-order byte listing the four directions in the given order
+    return sum(d << (2 * k) for k, d in enumerate(directions))
+
+
+def floodFillWalls(walls, nYCells, goal_coords):
+    # Computes every cell's BFS distance to goal_coords with NumPy, one wavefront per layer.
+    # walls holds one WALL_* mask per cell indexed by x * nY + y, with the outer boundary
+    # closed. Returns an int64 array of costs, UNREACHED where the goal cannot be reached.
+    masks = np.frombuffer(walls, dtype=np.uint8)
+    n = masks.size
+    costs = np.full(n, UNREACHED, dtype=np.int64)
+    goal_x, goal_y = goal_coords
+    if not (0 <= goal_x < n // nYCells and 0 <= goal_y < nYCells):
+        return costs
+
+    steps = ((WALL_N, 1), (WALL_E, nYCells), (WALL_S, -1), (WALL_W, -nYCells))
+    stamp = np.empty(n, dtype=np.int64)
+    frontier = np.array([goal_x * nYCells + goal_y], dtype=np.int64)
+    costs[frontier] = 0
+    layer = 0
+    while frontier.size:
+        layer += 1
+        frontier_walls = masks[frontier]
+        reached = np.concatenate([frontier[(frontier_walls & side) == 0] + step
+                                  for side, step in steps])
+        reached = reached[costs[reached] == UNREACHED]
+        # keep one copy of cells reached from more than one side
+        order = np.arange(reached.size)
+        stamp[reached] = order
+        reached = reached[stamp[reached] == order]
+        costs[reached] = layer
+        frontier = reached
+    return costs
+
 # ==========================================================
 # Helper Functions
     
@@ -197,3 +956,66 @@ def getNavigableNeighbors(wallsAroundCell, possibleNeighbors, prevCell, nXCells,
 
 def checkCellArrived(currentCell, dest):
     return currentCell == dest
+
+# Integer-direction versions of the helpers above for the control loop. They return
+# the same cells without the string comparisons or list searches.
+
+def getOrientationIndex(heading):
+    # Closest cardinal direction as DIR_N/E/S/W, same boundaries as getRobotOrientation
+    # (they fall on whole degrees, so truncating the heading doesn't move them)
+    return ORIENTATION_BY_DEGREE[int(heading % 360)]
+
+def getPotentialNeighborsByIndex(currCell, orient):
+    # (left, front, right, back) cells when facing orient
+    x, y = currCell
+    lx, ly, fx, fy, rx, ry, bx, by = RELATIVE_OFFSETS[orient]
+    return ((x + lx, y + ly), (x + fx, y + fy), (x + rx, y + ry), (x + bx, y + by))
+
+def getOpenNeighbors(wallsAroundCell, possibleNeighbors, prevCell, nXCells, nYCells):
+    # Same result as getNavigableNeighbors. Left, front and right are distinct cells,
+    # so the previous cell is the only possible duplicate.
+    navigable = [prevCell] if prevCell is not None else []
+    left_wall, front_wall, right_wall = wallsAroundCell
+    left, front, right, back = possibleNeighbors
+
+    if not left_wall and left != prevCell and 0 <= left[0] < nXCells and 0 <= left[1] < nYCells:
+        navigable.append(left)
+    if not front_wall and front != prevCell and 0 <= front[0] < nXCells and 0 <= front[1] < nYCells:
+        navigable.append(front)
+    if not right_wall and right != prevCell and 0 <= right[0] < nXCells and 0 <= right[1] < nYCells:
+        navigable.append(right)
+    return navigable
+
+def getOpenNeighborsByIndex(wallsAroundCell, currCell, orient, prevCell, nXCells, nYCells):
+    # Same cells as getOpenNeighbors(wallsAroundCell, getPotentialNeighborsByIndex(currCell,
+    # orient), ...), for the control loop: only the open sides inside the maze become
+    # tuples, so a tick builds the returned list and nothing else
+    navigable = [prevCell] if prevCell is not None else []
+    x, y = currCell
+    lx, ly, fx, fy, rx, ry, _, _ = RELATIVE_OFFSETS[orient]
+    px, py = prevCell if prevCell is not None else (-1, -1)
+    left_wall, front_wall, right_wall = wallsAroundCell
+
+    if not left_wall and 0 <= x + lx < nXCells and 0 <= y + ly < nYCells and (x + lx != px or y + ly != py):
+        navigable.append((x + lx, y + ly))
+    if not front_wall and 0 <= x + fx < nXCells and 0 <= y + fy < nYCells and (x + fx != px or y + fy != py):
+        navigable.append((x + fx, y + fy))
+    if not right_wall and 0 <= x + rx < nXCells and 0 <= y + ry < nYCells and (x + rx != px or y + ry != py):
+        navigable.append((x + rx, y + ry))
+    return navigable
+
+def getRouteSegments(currCell, route):
+    # Collapses a route into straight runs of [direction, cells], where direction is a
+    # DIR_* value and cells are the consecutive cells entered while heading that way
+    segments = []
+    prev = currCell
+    for cell in route:
+        direction = STEP_DIRECTION.get((cell[0] - prev[0], cell[1] - prev[1]))
+        if direction is None:
+            raise ValueError(f"route steps from {prev} to non-adjacent cell {cell}")
+        if segments and segments[-1][0] == direction:
+            segments[-1][1].append(cell)
+        else:
+            segments.append([direction, [cell]])
+        prev = cell
+    return segments
@@ -0,0 +1,79 @@
+# Finds parking gaps along a wall in one pass over the side sensor's distances, for
+# selfParking's scan.
+#
+#     gaps = GapDetector(open_above=200, close_below=60, min_length=50, keep=3)
+#     while scanning:
+#         gaps.update(irDistance(sensors[SENSOR2CHECK]), pose.x, pose.y)
+#     gaps.finish()
+#     best = gaps.largest()     # ((x1, y1), (x2, y2)) or None
+#
+# A gap opens where the distance rises above open_above and closes where it falls
+# below close_below. In between nothing changes (hysteresis), so a reading that
+# wobbles around one threshold doesn't split a gap in two. Gaps shorter than
+# min_length cm are dropped, and only the `keep` longest are kept (a min-heap, so the
+# shortest kept gap is the one to make room), however long the wall is.
+
+import heapq
+import math
+
+
+class GapDetector:
+    def __init__(self, open_above=200, close_below=60, min_length=0.0, keep=3):
+        if close_below > open_above:
+            raise ValueError("close_below must not be above open_above")
+        self.open_above = open_above
+        self.close_below = close_below
+        self.min_length = min_length
+        self.keep = keep
+        self.found = 0          # gaps closed, including the dropped ones
+        self.start = None       # (x, y) where the open gap started, None outside a gap
+        self._last = None       # (x, y) of the last update
+        self._heap = []         # (length, -order, gap), shortest first
+        self._order = 0
+
+    @property
+    def is_open(self):
+        return self.start is not None
+
+    def update(self, distance, x, y):
+        # Feeds one side distance taken at (x, y); returns the gap if this closed one
+        # that is long enough, else None
+        self._last = (x, y)
+        if self.start is None:
+            if distance > self.open_above:
+                self.start = (x, y)
+            return None
+        if distance < self.close_below:
+            return self._close(x, y)
+        return None
+
+    def finish(self):
+        # Closes a gap still open where the scan stopped; returns it like update()
+        if self.start is None:
+            return None
+        return self._close(*self._last)
+
+    def gaps(self):
+        # The kept gaps, longest first, each ((x1, y1), (x2, y2))
+        return [gap for length, order, gap in sorted(self._heap, key=lambda e: (-e[0], -e[1]))]
+
+    def largest(self):
+        # The longest gap (the first found of equally long ones), or None
+        kept = self.gaps()
+        return kept[0] if kept else None
+
+    def _close(self, x, y):
+        gap = (self.start, (x, y))
+        self.start = None
+        self.found += 1
+        length = math.hypot(x - gap[0][0], y - gap[0][1])
+        if length < self.min_length or self.keep <= 0:
+            return None
+        # order breaks ties in favour of the earlier gap; negated so it is dropped last
+        entry = (length, -self._order, gap)
+        self._order += 1
+        if len(self._heap) < self.keep:
+            heapq.heappush(self._heap, entry)
+        elif entry > self._heap[0]:
+            heapq.heapreplace(self._heap, entry)
+        return gap
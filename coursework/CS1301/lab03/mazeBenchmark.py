@@ -0,0 +1,324 @@
+# Benchmarks for the maze planners in MazeSolverHelpers.py
+#
+# Usage: python mazeBenchmark.py [sizes...] [--bench flood|update|explore|tick]
+#   e.g. python mazeBenchmark.py 3 64 1024
+#        python mazeBenchmark.py 8 32 --bench explore --loops 0.1 --seed 7
+
+import argparse
+import gc
+import random
+import time
+import tracemalloc
+
+from MazeSolverHelpers import (Cell, Maze, GridMaze, WALL_BETWEEN, STEP_DIRECTION, DIR_N,
+                               TURN_DEGREES, getRobotOrientation, getPotentialNeighbors,
+                               getNavigableNeighbors, getOrientationIndex,
+                               getPotentialNeighborsByIndex, getOpenNeighbors,
+                               getOpenNeighborsByIndex, checkCellArrived)
+
+FLOOD_SIZES = [3, 8, 32, 128, 512, 1024]
+EXPLORE_SIZES = [8, 16, 32]
+ALLOCATION_TICKS = 500  # ticks traced for allocations (each needs a full collection)
+DICT_MAZE_LIMIT = 256   # the dict-of-Cells Maze needs ~700 MB at 1024x1024
+EXPLORE_CONFIGS = [(Maze, "full"), (Maze, "incremental"), (Maze, "numpy"),
+                   (GridMaze, "full"), (GridMaze, "incremental"), (GridMaze, "numpy")]
+
+
+def timeIt(func, repeats):
+    # Best wall-clock time of several runs, in seconds
+    best = float('inf')
+    for _ in range(repeats):
+        start = time.perf_counter()
+        func()
+        best = min(best, time.perf_counter() - start)
+    return best
+
+
+def openMaze(cls, size, planner):
+    # size x size maze with every interior wall open
+    maze = cls(size, size, planner=planner)
+    maze.add_all_neighbors(size, size)
+    return maze
+
+
+def benchFloodFill(sizes):
+    # Full re-flood from the far corner with each planner on an open grid
+    print("Flood fill of an open NxN grid from the far corner (best of several runs)")
+    print(f"{'size':>6} {'Maze BFS':>12} {'GridMaze BFS':>14} {'GridMaze numpy':>16} {'speedup':>9}")
+    for size in sizes:
+        goal = (size - 1, size - 1)
+        repeats = 5 if size <= 128 else 2
+
+        dict_time = None
+        if size <= DICT_MAZE_LIMIT:
+            maze = openMaze(Maze, size, "full")
+            dict_time = timeIt(lambda: maze.update_costs(goal), repeats)
+
+        bfs = openMaze(GridMaze, size, "full")
+        bfs_time = timeIt(lambda: bfs.update_costs(goal), repeats)
+        vec = openMaze(GridMaze, size, "numpy")
+        vec_time = timeIt(lambda: vec.update_costs(goal), repeats)
+        if bfs.costs != vec.costs:
+            raise AssertionError(f"numpy costs differ from BFS costs at {size}x{size}")
+
+        dict_col = f"{dict_time * 1000:10.2f}ms" if dict_time is not None else f"{'-':>12}"
+        print(f"{size:>6} {dict_col} {bfs_time * 1000:12.2f}ms {vec_time * 1000:14.2f}ms "
+              f"{bfs_time / vec_time:8.1f}x")
+
+
+def benchUpdateNeighbors(sizes, calls=2000):
+    # Average cost of one sensor update (update_neighbors) at random cells
+    print(f"update_neighbors at {calls} random cells")
+    print(f"{'size':>6} {'Maze':>12} {'GridMaze':>12}")
+    rng = random.Random(1301)
+    for size in sizes:
+        updates = []
+        for _ in range(calls):
+            x, y = rng.randrange(size), rng.randrange(size)
+            sides = [(x, y + 1), (x + 1, y), (x, y - 1), (x - 1, y)]
+            navigable = [(nx, ny) for nx, ny in sides
+                         if 0 <= nx < size and 0 <= ny < size and rng.random() < 0.7]
+            updates.append(((x, y), navigable))
+
+        def run(maze):
+            for coords, navigable in updates:
+                maze.update_neighbors(coords, navigable)
+
+        columns = []
+        for cls in (Maze, GridMaze):
+            if cls is Maze and size > DICT_MAZE_LIMIT:
+                columns.append(f"{'-':>12}")
+                continue
+            maze = openMaze(cls, size, "full")
+            elapsed = timeIt(lambda: run(maze), 1)
+            columns.append(f"{elapsed / calls * 1e6:10.2f}us")
+        print(f"{size:>6} " + " ".join(columns))
+
+
+def generateMaze(size, rng, loops=0.0):
+    # Random maze as a GridMaze whose walls are the ground truth. A recursive
+    # backtracker carves a perfect maze (exactly one path between any two
+    # cells); loops > 0 then knocks out that fraction of the remaining
+    # interior walls to make an imperfect maze with cycles.
+    truth = GridMaze(size, size)
+    start = (0, 0)
+    seen = {start}
+    stack = [start]
+    while stack:
+        x, y = stack[-1]
+        options = [(x + dx, y + dy) for dx, dy in WALL_BETWEEN
+                   if truth.in_bounds((x + dx, y + dy)) and (x + dx, y + dy) not in seen]
+        if not options:
+            stack.pop()
+            continue
+        nxt = rng.choice(options)
+        truth.set_wall((x, y), nxt, False)
+        seen.add(nxt)
+        stack.append(nxt)
+
+    if loops > 0:
+        closed = [((x, y), (x + dx, y + dy))
+                  for x in range(size) for y in range(size) for dx, dy in ((1, 0), (0, 1))
+                  if truth.in_bounds((x + dx, y + dy))
+                  and truth.walls[truth.index((x, y))] & WALL_BETWEEN[(dx, dy)]]
+        for a, b in rng.sample(closed, int(len(closed) * loops)):
+            truth.set_wall(a, b, False)
+    return truth
+
+
+def senseWalls(truth, coords, potential):
+    # What the IR sensors would report for the left, front and right cells
+    walls = truth.walls[truth.index(coords)]
+    x, y = coords
+    return [not truth.in_bounds(n) or bool(walls & WALL_BETWEEN[(n[0] - x, n[1] - y)])
+            for n in potential[:3]]
+
+
+def explore(cls, planner, truth, start, dest, maxSteps):
+    # Drive the planner the same way navigateMaze does: sense, update_neighbors,
+    # update_costs, get_next_cell, move. The map starts optimistic (every
+    # interior wall open). Returns (planning seconds, steps, cells visited,
+    # turns, arrived).
+    size = truth.nX
+    maze = cls(size, size, planner=planner)
+    maze.add_all_neighbors(size, size)
+    prev, curr, orientation = None, start, DIR_N
+    maze.get_cell(curr).visited = True
+    visited = {curr}
+    steps = turns = 0
+    planning = 0.0
+
+    while not checkCellArrived(curr, dest) and steps < maxSteps:
+        potential = getPotentialNeighborsByIndex(curr, orientation)
+        navigable = getOpenNeighbors(senseWalls(truth, curr, potential), potential,
+                                     prev, size, size)
+        begin = time.perf_counter()
+        maze.update_neighbors(curr, navigable)
+        maze.update_costs(dest)
+        nxt = maze.get_next_cell(curr)
+        planning += time.perf_counter() - begin
+        if nxt is None:
+            break
+
+        heading = STEP_DIRECTION[(nxt[0] - curr[0], nxt[1] - curr[1])]
+        if heading != orientation:
+            turns += 1
+        prev, curr, orientation = curr, nxt, heading
+        maze.get_cell(curr).visited = True
+        visited.add(curr)
+        steps += 1
+
+    return planning, steps, len(visited), turns, checkCellArrived(curr, dest)
+
+
+def benchExplore(sizes, loops, seed):
+    # Full START -> DESTINATION exploration of generated perfect and imperfect
+    # mazes. Time per step covers the planner calls only; peak memory is
+    # measured in a second, traced run so tracing doesn't skew the timings.
+    print("Exploration from the corner to the centre of generated mazes")
+    print(f"{'size':>6} {'maze':>10} {'class':>9} {'planner':>12} {'per step':>11} "
+          f"{'peak mem':>10} {'visited':>8} {'moves':>7} {'turns':>6}")
+    for size in sizes:
+        start, dest = (0, 0), (size // 2, size // 2)
+        maxSteps = 20 * size * size
+        for label, fraction in (("perfect", 0.0), (f"loops {loops:g}", loops)):
+            truth = generateMaze(size, random.Random(f"{seed}-{size}"), fraction)
+            for cls, planner in EXPLORE_CONFIGS:
+                try:
+                    cls(1, 1, planner=planner)
+                except ImportError:
+                    continue
+                planning, steps, visited, turns, arrived = explore(
+                    cls, planner, truth, start, dest, maxSteps)
+
+                tracemalloc.start()
+                explore(cls, planner, truth, start, dest, maxSteps)
+                peak = tracemalloc.get_traced_memory()[1]
+                tracemalloc.stop()
+
+                moves = f"{steps:>7}" if arrived else f"{'DNF':>7}"
+                print(f"{size:>6} {label:>10} {cls.__name__:>9} {planner:>12} "
+                      f"{planning / max(steps, 1) * 1e6:9.1f}us {peak / 1024:8.0f}KB "
+                      f"{visited:>8} {moves} {turns:>6}")
+
+
+class DictCell:
+    # Cell without __slots__, as it was before, for the memory comparison
+    def __init__(self, x, y):
+        self.coords = (x,y)
+        self.neighbors = []
+        self.visited = False
+        self.cost = 0
+        self.flooded = False
+
+
+def stringTick(heading, cell, walls, prev, size):
+    # One control tick with string directions, as navigateMaze used to do it
+    orient = getRobotOrientation(heading)
+    potential = getPotentialNeighbors(cell, orient)
+    navigable = getNavigableNeighbors(walls, potential, prev, size, size)
+    nxt = navigable[-1]
+    dx = nxt[0] - cell[0]
+    dy = nxt[1] - cell[1]
+    if dx == 1:
+        target = "E"
+    elif dx == -1:
+        target = "W"
+    elif dy == 1:
+        target = "N"
+    else:
+        target = "S"
+    directions = ["N", "E", "S", "W"]
+    return (directions.index(target) - directions.index(orient)) % 4
+
+
+def indexTick(heading, cell, walls, prev, size):
+    # The same tick with DIR_* integers and the lookup tables
+    orient = getOrientationIndex(heading)
+    potential = getPotentialNeighborsByIndex(cell, orient)
+    navigable = getOpenNeighbors(walls, potential, prev, size, size)
+    nxt = navigable[-1]
+    return TURN_DEGREES[(STEP_DIRECTION[(nxt[0] - cell[0], nxt[1] - cell[1])] - orient) % 4]
+
+
+def directTick(heading, cell, walls, prev, size):
+    # The integer tick as navigateMaze does it, without the (left, front, right, back) tuple
+    orient = getOrientationIndex(heading)
+    navigable = getOpenNeighborsByIndex(walls, cell, orient, prev, size, size)
+    nxt = navigable[-1]
+    return TURN_DEGREES[(STEP_DIRECTION[(nxt[0] - cell[0], nxt[1] - cell[1])] - orient) % 4]
+
+
+def tickBytes(tick, inputs):
+    # Average bytes a tick has allocated at its peak, traced tick by tick. A full
+    # collection first empties CPython's free lists, which would otherwise hand out
+    # small tuples and lists without tracemalloc seeing them.
+    tracemalloc.start()
+    total = 0
+    for args in inputs:
+        gc.collect()
+        before = tracemalloc.get_traced_memory()[0]
+        tracemalloc.reset_peak()
+        tick(*args)
+        total += tracemalloc.get_traced_memory()[1] - before
+    tracemalloc.stop()
+    return total / len(inputs)
+
+
+def cellBytes(cls, count):
+    # Traced bytes per cell object
+    tracemalloc.start()
+    cells = [cls(i, i) for i in range(count)]
+    size = tracemalloc.get_traced_memory()[0]
+    tracemalloc.stop()
+    del cells
+    return size / count
+
+
+def benchControlTick(ticks=20000, size=16):
+    # Time and allocations of the per-cell orientation/neighbor/turn bookkeeping in
+    # navigateMaze, and the memory each Cell takes with and without __slots__
+    rng = random.Random(1301)
+    inputs = []
+    for _ in range(ticks):
+        cell = (rng.randrange(1, size - 1), rng.randrange(1, size - 1))
+        heading = rng.uniform(0, 360)
+        back = getPotentialNeighbors(cell, getRobotOrientation(heading))[3]
+        walls = [rng.random() < 0.5 for _ in range(3)]
+        inputs.append((heading, cell, walls, back, size))
+
+    for args in inputs:
+        if not stringTick(*args) == TURN_DEGREES.index(indexTick(*args)) == \
+                TURN_DEGREES.index(directTick(*args)):
+            raise AssertionError(f"integer tick disagrees with string tick for {args}")
+
+    print(f"Control tick bookkeeping ({ticks} ticks, best of 5)")
+    for name, tick in (("strings", stringTick), ("integers", indexTick), ("direct", directTick)):
+        elapsed = timeIt(lambda: [tick(*args) for args in inputs], 5)
+        print(f"{name:>10} {elapsed / ticks * 1e6:8.2f}us per tick "
+              f"{tickBytes(tick, inputs[:ALLOCATION_TICKS]):6.0f} peak bytes per tick")
+    print(f"{'Cell':>10} {cellBytes(DictCell, 10000):8.0f} bytes without __slots__, "
+          f"{cellBytes(Cell, 10000):.0f} with")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Benchmark the maze planners")
+    parser.add_argument("sizes", nargs="*", type=int, help="maze side lengths")
+    parser.add_argument("--bench", choices=["flood", "update", "explore", "tick"],
+                        help="run only one benchmark (default: all of them)")
+    parser.add_argument("--loops", type=float, default=0.1,
+                        help="fraction of interior walls removed for imperfect mazes")
+    parser.add_argument("--seed", type=int, default=1301, help="maze generator seed")
+    args = parser.parse_args()
+
+    if args.bench in (None, "flood"):
+        benchFloodFill(args.sizes or FLOOD_SIZES)
+        print()
+    if args.bench in (None, "update"):
+        benchUpdateNeighbors(args.sizes or FLOOD_SIZES)
+        print()
+    if args.bench in (None, "explore"):
+        benchExplore(args.sizes or EXPLORE_SIZES, args.loops, args.seed)
+        print()
+    if args.bench in (None, "tick"):
+        benchControlTick()
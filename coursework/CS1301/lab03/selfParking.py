@@ -1,14 +1,29 @@
-from irobot_edu_sdk.backend.bluetooth import Bluetooth
 from irobot_edu_sdk.robots import event, hand_over, Color, Robot, Root, Create3
 from irobot_edu_sdk.music import Note
 import math as m
+import os, sys
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "common"))
+from robotBackend import makeRobot  # real robot, or the simulator when CS1301_SIM_ARENA is set
+from sensorHub import SensorHub
+from irProcessing import irDistance
+from controlLoop import PeriodicLoop
+from poseEstimator import PoseEstimator
+from gapDetector import GapDetector
 
-# robot setup
-robot = Create3(Bluetooth("HRISTO-BOT"))  # change to your robot name
+# robot setup; PoseEstimator works out the pose from the wheel speeds between position
+# readings (every 0.5 s), so the loops below don't have to ask for it every tick
+robot = PoseEstimator(makeRobot("HRISTO-BOT"))  # change to your robot name
+
+# IR readings shared by the scanning loops, read at most 10 times a second
+hub = SensorHub(robot, rate=10, pose=False)
+
+# Paces the scanning and driving loops at 10 ticks a second (one loop runs at a time)
+control = PeriodicLoop(rate=10)
 
 HAS_COLLIDED = False
 SENSOR2CHECK = 0       # 0 = left wall, 6 = right wall
 ARRIVAL_THRESHOLD = 10 # how close to gap center to stop
+MIN_GAP_LENGTH = 50    # shorter gaps are too small to park in
 
 # ==== fail-safes ====
 
@@ -28,13 +43,15 @@ async def when_either_bumped(robot):
 
 # ==== small heading correction ====
 
-async def courseCorrect(robot, target_heading=90.0):
-    """Turn slightly to keep heading near target_heading."""
+async def courseCorrect(robot, target_heading=90.0, pose=None):
+    """Turn slightly to keep heading near target_heading.
+    Pass a pose that was just read to save asking the robot again."""
     global HAS_COLLIDED
     if HAS_COLLIDED:
         return
 
-    pose = await robot.get_position()
+    if pose is None:
+        pose = await robot.get_position()
     heading = pose.heading % 360
 
     error = (heading - target_heading + 180) % 360 - 180
@@ -52,11 +69,13 @@ async def findWall(robot):
 
     await robot.set_lights_rgb(0, 0, 255)
     await robot.set_wheel_speeds(5, 5)
+    control.reset()
 
     while not HAS_COLLIDED:
-        sensors = (await robot.get_ir_proximity()).sensors
-        left_dist = 4095 / (sensors[0] + 1)
-        right_dist = 4095 / (sensors[6] + 1)
+        sample = await hub.latest()
+        sensors = sample.ir
+        left_dist = irDistance(sensors[0])
+        right_dist = irDistance(sensors[6])
 
         if left_dist < 60 or right_dist < 60:
             await robot.set_wheel_speeds(0, 0)
@@ -69,86 +88,46 @@ async def findWall(robot):
             await robot.set_lights_rgb(0, 255, 255)
             break
 
-        await courseCorrect(robot, target_heading=90.0)
-        await robot.wait(0.1)
+        await courseCorrect(robot, target_heading=90.0, pose=await robot.pose())
+        await control.tick()
 
     await robot.set_wheel_speeds(0, 0)
 
-# ==== calculateGap: start/end of a single gap ====
-
-async def calculateGap(robot):
-    global SENSOR2CHECK, HAS_COLLIDED
-    if HAS_COLLIDED:
-        return ((0, 0), (0, 0))
-
-    pose = await robot.get_position()
-    start_pos = (pose.x, pose.y)
-
-    await robot.set_wheel_speeds(5, 5)
-
-    while not HAS_COLLIDED:
-        await courseCorrect(robot, target_heading=90.0)
-
-        sensors = (await robot.get_ir_proximity()).sensors
-        side_dist = 4095 / (sensors[SENSOR2CHECK] + 1)
-
-        if side_dist < 60:
-            await robot.set_wheel_speeds(0, 0)
-            break
-
-        await robot.wait(0.1)
-
-    pose = await robot.get_position()
-    end_pos = (pose.x, pose.y)
-
-    dx = end_pos[0] - start_pos[0]
-    dy = end_pos[1] - start_pos[1]
-    gap_len = m.sqrt(dx * dx + dy * dy)
-
-    return (start_pos, end_pos)
-
 # ==== findGaps: scan along wall and pick largest ====
 
 async def findGaps(robot):
     global SENSOR2CHECK, HAS_COLLIDED
-    gaps = []
+    # gap: side opens up (distance above 200) until it closes again (below 60);
+    # only the 3 longest are kept
+    gaps = GapDetector(open_above=200, close_below=60, min_length=MIN_GAP_LENGTH, keep=3)
 
     await robot.set_lights_rgb(0, 255, 255)
     await robot.set_wheel_speeds(5, 5)
+    control.reset()
 
     while not HAS_COLLIDED:
-        sensors = (await robot.get_ir_proximity()).sensors
+        sample = await hub.latest()
+        sensors = sample.ir
+        pose = await robot.pose()
 
         # stop scan when front wall within ~10 units
-        front_dist = 4095 / (sensors[3] + 1)
+        front_dist = irDistance(sensors[3])
         if front_dist < 10:
             await robot.set_wheel_speeds(0, 0)
             break
 
-        side_dist = 4095 / (sensors[SENSOR2CHECK] + 1)
+        gaps.update(irDistance(sensors[SENSOR2CHECK]), pose.x, pose.y)
 
-        # gap: side opens up (bigger distance value)
-        if side_dist > 200:
-            gap = await calculateGap(robot)
-            gaps.append(gap)
-            await robot.set_wheel_speeds(5, 5)
+        await courseCorrect(robot, target_heading=90.0, pose=pose)
+        await control.tick()
 
-        await courseCorrect(robot, target_heading=90.0)
-        await robot.wait(0.1)
-
-    if not gaps:
+    if HAS_COLLIDED:
         return ((0, 0), (0, 0))
 
-    largest_gap = None
-    largest_len = -1.0
-    for i, gap in enumerate(gaps):
-        (x1, y1) = gap[0]
-        (x2, y2) = gap[1]
-        dist = m.sqrt((x2 - x1)**2 + (y2 - y1)**2)
-        if dist > largest_len:
-            largest_len = dist
-            largest_gap = gap
-
+    gaps.finish()  # a gap still open at the end of the wall ends here
+    largest_gap = gaps.largest()
+    if largest_gap is None:
+        return ((0, 0), (0, 0))
     return largest_gap
 
 # ==== park: go to center of largest gap, then enter ====
@@ -165,7 +144,7 @@ async def park(robot):
 
     gap_size = m.sqrt((x2 - x1)**2 + (y2 - y1)**2)
 
-    if gap_size < 50:  
+    if gap_size < MIN_GAP_LENGTH:
         await robot.set_lights_rgb(255, 0, 0)
         await robot.set_wheel_speeds(0, 0)
         return
@@ -196,19 +175,17 @@ async def park(robot):
     drive_heading = angle_to_center
     await robot.set_wheel_speeds(5, 5)
 
-    while not HAS_COLLIDED:
-        pose = await robot.get_position()
-        curr_x, curr_y = pose.x, pose.y
-
-        dist_to_center = m.sqrt((center_x - curr_x)**2 + (center_y - curr_y)**2)
-
-        if dist_to_center <= ARRIVAL_THRESHOLD:
-            break
+    def distance_left(pose):
+        dist_to_center = m.sqrt((center_x - pose.x)**2 + (center_y - pose.y)**2)
+        return dist_to_center - ARRIVAL_THRESHOLD
 
-        await courseCorrect(robot, target_heading=drive_heading)
-        await robot.wait(0.1)
+    async def correct(pose):
+        await courseCorrect(robot, target_heading=drive_heading, pose=pose)
+        if robot.speed == 0:
+            await robot.set_wheel_speeds(5, 5)  # a correcting turn leaves the wheels stopped
 
-    await robot.set_wheel_speeds(0, 0)
+    # Stops the wheels when the predicted position is close enough to the centre
+    await robot.drive_until(distance_left, should_stop=lambda: HAS_COLLIDED, on_pose=correct)
 
     if HAS_COLLIDED:
         return
@@ -237,6 +214,8 @@ async def selfParking(robot):
     if not HAS_COLLIDED:
         await park(robot)
 
+    hub.stop()
     await robot.set_wheel_speeds(0, 0)
+    print("Control loop: " + control.summary())
 
 robot.play()